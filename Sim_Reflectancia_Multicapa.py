@@ -1,49 +1,58 @@
+import io
+from pathlib import Path
+
 import numpy as np
 import pandas as pd
-import cmath
 import matplotlib.pyplot as plt
 import streamlit as st
 import plotly.express as px
-from cmath import asin, cos, sin
-
-# Fresnel coefficients for oblique incidence
-def fresnel_coefficients_oblique(n1, n2, theta1, polarization="s"):
-    theta2 = asin(n1 * sin(theta1) / n2)  # Snell's law
-    if polarization == "s":
-        r = (n1 * cos(theta1) - n2 * cos(theta2)) / (n1 * cos(theta1) + n2 * cos(theta2))
-    else:  # p-polarized
-        r = (n2 * cos(theta1) - n1 * cos(theta2)) / (n2 * cos(theta1) + n1 * cos(theta2))
-    return r
-
-# Phase shift function
-def phase_shift(n, d, lambda_):
-    return 2 * np.pi * n * d / lambda_
-
-# Total reflectance for oblique incidence
+from ingest_cache import read_excel_cached
+from multilayer_engine import MaterialTable, adaptive_spectrum, available_materials, band_average, block_repeats, band_target, catalog_spectra, coefficient_from_dataframe, designs_from_folder, designs_from_workbook, expanded_layers, field_profile, fit_design, incremental_reflection_coefficient, reflectance_map, stack_from_dataframe, table_reflection_coefficient, tolerance_analysis, write_catalog
+
+# Catalog workbooks are parsed once per content (Streamlit hashes the bytes), not on every rerun
+@st.cache_data(max_entries=32)
+def cached_workbook_designs(content, prefix):
+    return designs_from_workbook(io.BytesIO(content), prefix=prefix)
+
+
+# `listing` (file names and modification times) invalidates the entry when the folder changes
+@st.cache_data(max_entries=8)
+def cached_folder_designs(folder, listing):
+    return designs_from_folder(folder)
+
+
+# Uploaded n, k tables are parsed once per content; equal contents share resampled grids
+@st.cache_data(max_entries=64)
+def cached_material_table(name, content):
+    return MaterialTable(name, pd.read_csv(io.BytesIO(content)))
+
+
+# Total reflectance for oblique incidence (lambda_ may be a scalar or an array of wavelengths)
 def total_reflectance_oblique(layers, lambda_, n_substrate, theta_incidence=0, polarization="s"):
-    theta_incidence = np.deg2rad(theta_incidence)  # Convert to radians
-    n_values = [1.0] + list(layers['Refractive index n']) + [n_substrate]
-    d_values = [np.inf] + list(layers['Thickness (nm)']) + [np.inf]
-    r = fresnel_coefficients_oblique(n_values[0], n_values[1], theta_incidence, polarization)
-    for i in range(1, len(n_values) - 1):
-        theta_i = asin(n_values[i - 1] * sin(theta_incidence) / n_values[i])  # Snell's law
-        r_i = fresnel_coefficients_oblique(n_values[i], n_values[i + 1], theta_i, polarization)
-        phi_i = phase_shift(n_values[i], d_values[i], lambda_)
-        r = (r + r_i * cmath.exp(2j * phi_i)) / (1 + r * r_i * cmath.exp(2j * phi_i))
-    return abs(r)**2
+    coefficient, _ = coefficient_from_dataframe(layers, n_substrate, materials=materials)
+    return np.abs(coefficient(lambda_, theta_incidence, polarization))**2
     
-def plot_spectrum(data, n_substrate, lambda_min, lambda_max, log_scale):
-    wavelengths = np.linspace(lambda_min, lambda_max, 1000)
-    reflectance = [total_reflectance_oblique(data, lambda_, n_substrate, theta_incidence, polarization) for lambda_ in wavelengths] 
-
+def plot_spectrum(data, n_substrate, lambda_min, lambda_max, log_scale, cache=None, adaptive=False):
+    if adaptive:
+        # Coarse grid refined only where the spectrum has structure
+        coefficient, _ = coefficient_from_dataframe(data, n_substrate, materials=materials)
+        wavelengths, reflectance = adaptive_spectrum(lambda w: np.abs(coefficient(w, theta_incidence, polarization))**2, lambda_min, lambda_max)
+    elif cache is None:
+        wavelengths = np.linspace(lambda_min, lambda_max, 1000)
+        reflectance = total_reflectance_oblique(data, wavelengths, n_substrate, theta_incidence, polarization)
+    else:
+        # Only the layers edited since the previous rerun are recomputed
+        wavelengths = np.linspace(lambda_min, lambda_max, 1000)
+        n_values, d_values = stack_from_dataframe(data, n_substrate, wavelengths=wavelengths, materials=materials)
+        reflectance = np.abs(incremental_reflection_coefficient(cache, n_values, d_values, wavelengths, theta_incidence, polarization))**2
     
-    if log_scale:
-        reflectance = np.log10(reflectance)
+    # Only the plotted curve goes on the log scale; callers get linear R
+    plotted = np.log10(reflectance) if log_scale else reflectance
 
     # Create a DataFrame for Plotly
     plot_data = pd.DataFrame({
         'Wavelength (nm)': wavelengths,
-        'Reflectance': reflectance
+        'Reflectance': plotted
     })
 
     # Create the Plotly figure
@@ -55,19 +64,120 @@ def plot_spectrum(data, n_substrate, lambda_min, lambda_max, log_scale):
     )
 
     # Add annotations for peak and minimum reflectance
-    fig.add_annotation(x=wavelengths[np.argmax(reflectance)], y=max(reflectance), text="Pico de Reflectancia", showarrow=True, arrowhead=2)
-    fig.add_annotation(x=wavelengths[np.argmin(reflectance)], y=min(reflectance), text="Reflectancia Mínima", showarrow=True, arrowhead=2)
+    fig.add_annotation(x=wavelengths[np.argmax(plotted)], y=max(plotted), text="Pico de Reflectancia", showarrow=True, arrowhead=2)
+    fig.add_annotation(x=wavelengths[np.argmin(plotted)], y=min(plotted), text="Reflectancia Mínima", showarrow=True, arrowhead=2)
 
     st.plotly_chart(fig, use_container_width=True)
     return wavelengths, reflectance  # Return these values
 
 
-def display_spectrum(data, n_substrate, lambda_min, lambda_max, log_scale):
-    wavelengths, reflectance = plot_spectrum(data, n_substrate, lambda_min, lambda_max, log_scale)
+def display_spectrum(data, n_substrate, lambda_min, lambda_max, log_scale, cache=None, adaptive=False):
+    wavelengths, reflectance = plot_spectrum(data, n_substrate, lambda_min, lambda_max, log_scale, cache, adaptive)
     st.subheader("Resultados Clave:")
     st.markdown(f"**Pico de Reflectancia:** {max(reflectance):.2f} en {wavelengths[np.argmax(reflectance)]:.2f} nm")
     st.markdown(f"**Reflectancia Mínima:** {min(reflectance):.2f} en {wavelengths[np.argmin(reflectance)]:.2f} nm")
-    st.markdown(f"**Reflectancia Promedio:** {np.mean(reflectance):.2f}")
+    # Trapezoidal average: the adaptive grid is denser around resonances
+    st.markdown(f"**Reflectancia Promedio:** {band_average(wavelengths, reflectance):.2f}")
+
+def display_reflectance_map(data, n_substrate, lambda_min, lambda_max):
+    st.subheader("Mapa de reflectancia R(λ, θ):")
+    theta_min, theta_max = st.slider('Rango de ángulos de incidencia (grados):', min_value=0.0, max_value=89.9, value=(0.0, 80.0))
+    num_angles = st.number_input('Número de ángulos:', min_value=2, max_value=1000, value=90)
+    wavelengths = np.linspace(lambda_min, lambda_max, 1000)
+    angles = np.linspace(theta_min, theta_max, int(num_angles))
+    coefficient, terms_per_sample = coefficient_from_dataframe(data, n_substrate, materials=materials)
+    maps = reflectance_map(coefficient, wavelengths, angles, terms_per_sample)
+
+    titles = {'s': 'Polarización s', 'p': 'Polarización p', 'unpolarized': 'No polarizada'}
+    for tab, (key, title) in zip(st.tabs(list(titles.values())), titles.items()):
+        with tab:
+            fig = px.imshow(maps[key], x=wavelengths, y=angles, origin='lower', aspect='auto', zmin=0, zmax=1,
+                            color_continuous_scale='Viridis', labels={'x': 'Longitud de onda (nm)', 'y': 'Ángulo (grados)', 'color': 'Reflectancia'},
+                            title=f'Reflectancia R(λ, θ) - {title}')
+            st.plotly_chart(fig, use_container_width=True)
+
+def display_inverse_design(data, n_substrate, lambda_min, lambda_max):
+    st.subheader("Diseño inverso (ajuste de espesores):")
+    target_file = st.file_uploader('Espectro objetivo (columnas Wavelength (nm), Target Reflectance y opcional Weight):', type=['xlsx', 'xls', 'csv'])
+    if target_file:
+        target = pd.read_csv(target_file) if target_file.name.endswith('.csv') else read_excel_cached(target_file)
+    else:
+        band_min, band_max = st.slider('Banda objetivo (nm):', min_value=lambda_min, max_value=lambda_max, value=(lambda_min, (lambda_min + lambda_max) / 2))
+        r_in_band = st.number_input('Reflectancia objetivo en la banda:', min_value=0.0, max_value=1.0, value=1.0)
+        r_out_of_band = st.number_input('Reflectancia objetivo fuera de la banda:', min_value=0.0, max_value=1.0, value=0.0)
+        target = band_target(lambda_min, lambda_max, band_min, band_max, r_in_band, r_out_of_band)
+    n_starts = st.number_input('Número de arranques aleatorios:', min_value=1, max_value=512, value=16)
+    iterations = st.number_input('Iteraciones por arranque:', min_value=10, max_value=5000, value=300)
+    d_min, d_max = st.slider('Límites de espesor (nm):', min_value=0.0, max_value=2000.0, value=(5.0, 500.0))
+
+    if st.button('Optimizar espesores'):
+        designs = fit_design(data, n_substrate, target, theta_incidence, polarization, int(n_starts), (d_min, d_max), int(iterations), materials=materials)
+        st.markdown("**Mejores diseños (error cuadrático ponderado):** " + ", ".join(f"{merit:.4g}" for merit, _ in designs))
+        best = designs[0][1]
+        wavelengths = np.asarray(target['Wavelength (nm)'], dtype=float)
+        plot_data = pd.DataFrame({
+            'Wavelength (nm)': np.concatenate([wavelengths, wavelengths]),
+            'Reflectance': np.concatenate([target['Target Reflectance'], total_reflectance_oblique(best, wavelengths, n_substrate, theta_incidence, polarization)]),
+            'Curva': ['Objetivo'] * len(wavelengths) + ['Mejor diseño'] * len(wavelengths),
+        })
+        fig = px.line(plot_data, x='Wavelength (nm)', y='Reflectance', color='Curva', title='Espectro objetivo vs mejor diseño')
+        st.plotly_chart(fig, use_container_width=True)
+        st.dataframe(best)
+        buffer = io.BytesIO()
+        best.to_excel(buffer, index=False)
+        st.download_button('Descargar mejor diseño (Excel)', buffer.getvalue(), file_name='diseno_optimizado.xlsx')
+
+def display_tolerance_analysis(data, n_substrate, lambda_min, lambda_max):
+    st.subheader("Análisis de tolerancias (Monte Carlo):")
+    thickness_sigma = st.number_input('Desviación estándar del espesor (%):', min_value=0.0, max_value=50.0, value=2.0) / 100
+    index_sigma = st.number_input('Desviación estándar del índice (%):', min_value=0.0, max_value=50.0, value=1.0) / 100
+    trials = st.number_input('Número de muestras:', min_value=10, max_value=100000, value=1000)
+    band_min, band_max = st.slider('Ventana de especificación (nm):', min_value=lambda_min, max_value=lambda_max, value=(lambda_min, lambda_max))
+    r_min, r_max = st.slider('Reflectancia admitida en la ventana:', min_value=0.0, max_value=1.0, value=(0.0, 1.0))
+
+    wavelengths = np.linspace(lambda_min, lambda_max, 1000)
+    result = tolerance_analysis(data, n_substrate, wavelengths, thickness_sigma, index_sigma, int(trials), theta_incidence, polarization, spec=(band_min, band_max, r_min, r_max), materials=materials)
+    curves = {'P5': result['P5'], 'P50': result['P50'], 'P95': result['P95'], 'Nominal': result['nominal']}
+    plot_data = pd.DataFrame({
+        'Wavelength (nm)': np.tile(wavelengths, len(curves)),
+        'Reflectance': np.concatenate(list(curves.values())),
+        'Curva': np.repeat(list(curves.keys()), len(wavelengths)),
+    })
+    fig = px.line(plot_data, x='Wavelength (nm)', y='Reflectance', color='Curva', title='Bandas de percentiles de la reflectancia')
+    fig.add_vrect(x0=band_min, x1=band_max, fillcolor='green', opacity=0.1, line_width=0)
+    st.plotly_chart(fig, use_container_width=True)
+    st.markdown(f"**Rendimiento (muestras dentro de especificación):** {result['yield']:.1%}")
+
+def display_field_profile(data, n_substrate, lambda_min, lambda_max):
+    st.subheader("Perfil de campo eléctrico |E(z)|²:")
+    selected = st.text_input('Longitudes de onda (nm, separadas por comas):', value=f"{(lambda_min + lambda_max) / 2:.0f}")
+    wavelengths = np.array([float(value) for value in selected.split(',') if value.strip()])
+    if wavelengths.size == 0:
+        return
+    layers = expanded_layers(data)
+    n_values, d_values = stack_from_dataframe(layers, n_substrate, wavelengths=wavelengths, materials=materials)
+    depths, intensity, interfaces, exact_reflectance = field_profile(n_values, d_values, wavelengths, theta_incidence, polarization)
+    spectrum_reflectance = np.abs(table_reflection_coefficient(data, n_substrate, 1.0, wavelengths, theta_incidence, polarization, materials)) ** 2
+
+    plot_data = pd.DataFrame({
+        'Profundidad (nm)': np.tile(depths, wavelengths.size),
+        '|E|²': intensity.T.ravel(),
+        'Longitud de onda': np.repeat([f'{value:g} nm' for value in wavelengths], depths.size),
+    })
+    fig = px.line(plot_data, x='Profundidad (nm)', y='|E|²', color='Longitud de onda', title='Intensidad del campo dentro de la multicapa (relativa a la incidente)')
+    if len(interfaces) <= 200:
+        for interface in interfaces:
+            fig.add_vline(x=interface, line_width=0.5, line_dash='dot', line_color='gray')
+    st.plotly_chart(fig, use_container_width=True)
+    st.caption('El campo se calcula con el método exacto de matrices características, no con la recursión capa a capa del espectro. '
+               'Ambos coinciden solo para una capa a incidencia normal; con más capas o en ángulo, la R del espectro puede diferir de la R exacta indicada abajo.')
+    for value, profile, r_exact, r_spectrum in zip(wavelengths, intensity.T, exact_reflectance, spectrum_reflectance):
+        inside = (depths >= 0) & (depths <= interfaces[-1])
+        if inside.any():
+            peak = np.argmax(np.where(inside, profile, -np.inf))
+            offset = depths[peak] - interfaces[np.argmin(np.abs(interfaces - depths[peak]))]
+            st.markdown(f"**{value:g} nm:** máximo |E|² = {profile[peak]:.2f} a {depths[peak]:.1f} nm de profundidad ({offset:+.1f} nm desde la interfaz más cercana); "
+                        f"R exacta = {r_exact:.4f}, R del espectro = {r_spectrum:.4f}")
 
 # Custom styling based on user choice
 theme_choice = st.sidebar.selectbox('Choose Theme:', ['Light', 'Dark'])
@@ -109,7 +219,16 @@ else:
 
 st.title('Espectro de Reflectancia de la Multicapa')
 
-option = st.selectbox('Seleccione una opción:', ['Subir archivo', 'Agregar capas manualmente'])
+with st.sidebar.expander('Biblioteca de materiales'):
+    material_files = st.file_uploader('Tablas n, k (CSV con Wavelength (nm), n, k):', type=['csv'], accept_multiple_files=True)
+    # Uploaded tables belong to this session only
+    materials = {}
+    for material_file in material_files or []:
+        table = cached_material_table(material_file.name.rsplit('.', 1)[0], material_file.getvalue())
+        materials[table.name.lower()] = table
+    st.markdown("**Materiales disponibles:** " + ", ".join(available_materials(materials)))
+
+option = st.selectbox('Seleccione una opción:', ['Subir archivo', 'Agregar capas manualmente', 'Catálogo de diseños (lote)'])
 
 st.markdown("---")
 
@@ -117,10 +236,15 @@ if option == 'Subir archivo':
     st.subheader("Subir archivo Excel:")
     uploaded_file = st.file_uploader('', type=['xlsx', 'xls'])
     if uploaded_file:
-        data = pd.read_excel(uploaded_file)
+        data = read_excel_cached(uploaded_file)
         st.session_state.data_uploaded = data
     if 'data_uploaded' in st.session_state:
         data = st.session_state.data_uploaded
+        try:
+            block_repeats(data)
+        except ValueError as error:
+            st.error(str(error))
+            st.stop()
         st.subheader("Parámetros:")
         n_substrate = st.number_input('Índice de refracción del sustrato:', min_value=1.0, value=1.5)
         theta_incidence = st.number_input('Ángulo de incidencia (grados):', min_value=0.0, max_value=90.0, value=0.0)  # Add this line
@@ -129,7 +253,20 @@ if option == 'Subir archivo':
         lambda_max = st.slider('Maximum Wavelength (nm):', min_value=lambda_min, max_value=11000.0, value=800.0)
 
         log_scale = st.checkbox('Usar escala logarítmica para reflectancia')
-        display_spectrum(data, n_substrate, lambda_min, lambda_max, log_scale)
+        adaptive = st.checkbox('Muestreo adaptativo de longitudes de onda', value=True)
+        display_spectrum(data, n_substrate, lambda_min, lambda_max, log_scale, adaptive=adaptive)
+
+        if st.checkbox('Mostrar mapa ángulo × longitud de onda (s, p y no polarizada)'):
+            display_reflectance_map(data, n_substrate, lambda_min, lambda_max)
+
+        if st.checkbox('Diseño inverso: ajustar espesores a un espectro objetivo'):
+            display_inverse_design(data, n_substrate, lambda_min, lambda_max)
+
+        if st.checkbox('Análisis de tolerancias (Monte Carlo)'):
+            display_tolerance_analysis(data, n_substrate, lambda_min, lambda_max)
+
+        if st.checkbox('Perfil de campo eléctrico |E(z)|²'):
+            display_field_profile(data, n_substrate, lambda_min, lambda_max)
 
 if option == 'Agregar capas manualmente':
     st.subheader('Agregar capas manualmente:')
@@ -151,25 +288,72 @@ if option == 'Agregar capas manualmente':
     lambda_min, lambda_max = st.slider('Rango de longitudes de onda (nm):', min_value=200.0, max_value=2000.0, value=(400.0, 800.0))
 
     log_scale = st.checkbox('Usar escala logarítmica para reflectancia')
-    if st.button('Graficar Espectro'):
-        display_spectrum(data, n_substrate, lambda_min, lambda_max, log_scale)
+    display_spectrum(data, n_substrate, lambda_min, lambda_max, log_scale, cache=st.session_state.setdefault('layer_cache', {}))
 
-    wavelengths, reflectance = plot_spectrum(data, n_substrate, lambda_min, lambda_max, log_scale)  # Unpack returned values
-    st.subheader("Resultados Clave:")
-    st.markdown(f"**Pico de Reflectancia:** {max(reflectance):.2f} en {wavelengths[np.argmax(reflectance)]:.2f} nm")
-    st.markdown(f"**Reflectancia Mínima:** {min(reflectance):.2f} en {wavelengths[np.argmin(reflectance)]:.2f} nm")
-    st.markdown(f"**Reflectancia Promedio:** {np.mean(reflectance):.2f}")
+    if st.checkbox('Mostrar mapa ángulo × longitud de onda (s, p y no polarizada)'):
+        display_reflectance_map(data, n_substrate, lambda_min, lambda_max)
+
+    if st.checkbox('Diseño inverso: ajustar espesores a un espectro objetivo'):
+        display_inverse_design(data, n_substrate, lambda_min, lambda_max)
+
+    if st.checkbox('Análisis de tolerancias (Monte Carlo)'):
+        display_tolerance_analysis(data, n_substrate, lambda_min, lambda_max)
+
+    if st.checkbox('Perfil de campo eléctrico |E(z)|²'):
+        display_field_profile(data, n_substrate, lambda_min, lambda_max)
+
+if option == 'Catálogo de diseños (lote)':
+    st.subheader('Catálogo de diseños:')
+    workbooks = st.file_uploader('Libros Excel (cada hoja es un diseño):', type=['xlsx', 'xls'], accept_multiple_files=True)
+    folder = st.text_input('O carpeta del servidor con diseños (.xlsx/.xls/.csv):')
+    designs = {}
+    for workbook in workbooks or []:
+        designs.update(cached_workbook_designs(workbook.getvalue(), f"{workbook.name.rsplit('.', 1)[0]}/"))
+    if folder:
+        listing = tuple(sorted((path.name, path.stat().st_mtime_ns) for path in Path(folder).iterdir()))
+        designs.update(cached_folder_designs(folder, listing))
+
+    if designs:
+        st.subheader("Parámetros:")
+        n_substrate = st.number_input('Índice de refracción del sustrato:', min_value=1.0, value=1.5)
+        theta_incidence = st.number_input('Ángulo de incidencia (grados):', min_value=0.0, max_value=90.0, value=0.0)
+        polarization = st.selectbox('Polarización:', ['s', 'p'])
+        lambda_min, lambda_max = st.slider('Rango de longitudes de onda (nm):', min_value=200.0, max_value=11000.0, value=(400.0, 800.0))
+        band = st.slider('Banda para la reflectancia promedio (nm):', min_value=lambda_min, max_value=lambda_max, value=(lambda_min, lambda_max))
+
+        if st.button(f'Calcular {len(designs)} diseños'):
+            wavelengths = np.linspace(lambda_min, lambda_max, 1000)
+            summary, spectra = catalog_spectra(designs, n_substrate, wavelengths, theta_incidence, polarization, band, materials=materials)
+            st.session_state.catalog = (summary, wavelengths, spectra)
+
+    if 'catalog' in st.session_state:
+        summary, wavelengths, spectra = st.session_state.catalog
+        failed = summary['Error'].notna()
+        if failed.any():
+            st.warning(f"{failed.sum()} de {len(summary)} diseños no se pudieron calcular; vea la columna 'Error'.")
+        st.dataframe(summary)
+        output_format = st.selectbox('Formato de salida:', ['parquet', 'npz'])
+        buffer = io.BytesIO()
+        write_catalog(buffer, summary, wavelengths, spectra, output_format)
+        st.download_button('Descargar catálogo', buffer.getvalue(), file_name=f'catalogo_reflectancia.{output_format}')
 
 
 # Documentation section
 st.markdown("---")
 st.header("Instrucciones para el uso del programa")
 st.markdown("""
-1. **Seleccione una opción**: Puede elegir entre subir un archivo Excel con las capas predefinidas o agregar capas manualmente.
+1. **Seleccione una opción**: Puede elegir entre subir un archivo Excel con las capas predefinidas, agregar capas manualmente o calcular un catálogo de diseños en lote.
 2. **Subir archivo Excel**: Si elige subir un archivo, asegúrese de que tenga las columnas 'Material', 'Refractive index n' y 'Thickness (nm)'.
+   Para multicapas periódicas (p. ej. espejos de Bragg) agregue las columnas opcionales 'Block' y 'Repeats': las filas consecutivas con el mismo 'Block' forman una celda unidad que se repite 'Repeats' veces, sin necesidad de escribir cada capa.
+   Si el 'Material' de una capa coincide con la biblioteca de materiales (modelos de Sellmeier/Cauchy o tablas n, k en CSV), se usa su índice dispersivo n(λ) + i·k(λ) en lugar de 'Refractive index n'.
 3. **Agregar capas manualmente**: Si elige agregar capas manualmente, complete los campos para cada capa y haga clic en 'Agregar capa' para agregar más capas.
-4. **Parámetros**: Ingrese el índice de refracción del sustrato y el rango de longitudes de onda.
-5. **Graficar Espectro**: Haga clic en este botón para calcular y visualizar el espectro de reflectancia.
+4. **Parámetros**: Ingrese el índice de refracción del sustrato y el rango de longitudes de onda. Con el muestreo adaptativo, el espectro parte de una malla gruesa y se refina solo donde hay estructura y alrededor del pico y el mínimo.
+5. **Espectro**: El espectro de reflectancia se recalcula automáticamente; al editar una capa solo se recalcula esa capa.
+6. **Mapa ángulo × longitud de onda**: Active la casilla para ver R(λ, θ) en polarización s, p y no polarizada como mapas de calor.
+7. **Diseño inverso**: Suba un espectro objetivo (o defina una banda) y el programa ajusta los espesores de las capas, manteniendo materiales e índices, con varios arranques aleatorios en paralelo. El mejor diseño se puede descargar en el mismo formato de Excel que acepta el cargador.
+8. **Análisis de tolerancias**: Simula miles de copias de la multicapa con espesores e índices perturbados aleatoriamente y muestra las bandas P5/P50/P95 de la reflectancia y el rendimiento frente a una ventana de especificación.
+9. **Perfil de campo eléctrico**: Muestra |E(z)|² dentro de la multicapa para las longitudes de onda elegidas, junto a las interfaces, para ubicar los máximos del campo (útil para daño láser). Se calcula con el método exacto de matrices características, por lo que la R exacta que acompaña al perfil puede diferir de la del espectro (recursión capa a capa) cuando hay varias capas o incidencia oblicua.
+10. **Catálogo de diseños (lote)**: Suba uno o varios libros Excel (cada hoja con las columnas de capas es un diseño) o indique una carpeta. Los espectros se calculan en paralelo y el resumen (pico, mínimo y reflectancia promedio en la banda) se guarda en Parquet o NPZ para ordenar y filtrar el catálogo sin recalcular.
 """)
 
 st.header("Explicación de la matemática y simulación")
@@ -0,0 +1,595 @@
+import io
+import os
+import socket
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from ingest_cache import read_excel_cached
+
+
+# Smoothing / differentiation of a sampled position trace. Every method takes
+# the sample times t (strictly increasing, any spacing) and positions y and
+# returns (position, velocity, acceleration) at the same samples.
+def polyfit_derivatives(t, y, degree=40, window=5):
+    """The original pipeline: global polynomial fit, finite differences, rolling-mean velocity.
+
+    The first samples come back as NaN, as with pandas' diff and rolling.
+    """
+    t = pd.Series(np.asarray(t, dtype=float))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', np.exceptions.RankWarning)
+        fitted = pd.Series(np.poly1d(np.polyfit(t, y, degree))(t))
+    velocity = (fitted.diff() / t.diff()).rolling(window=window).mean()
+    acceleration = velocity.diff() / t.diff()
+    return fitted.to_numpy(), velocity.to_numpy(), acceleration.to_numpy()
+
+
+def savgol_derivatives(t, y, window=21, order=3):
+    """Savitzky-Golay smoothing for non-uniform spacing.
+
+    A polynomial of degree `order` is least-squares fitted to the `window`
+    samples around each point (windows are shifted inwards at the ends) and
+    its value and first two derivatives at that point are kept. The small
+    fits are solved together in blocks, so the cost is O(n * window * order).
+    """
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(t)
+    window = min(window, n)
+    start = np.clip(np.arange(n) - window // 2, 0, n - window)
+    # Local times scaled to about [-1, 1] keep the normal equations well conditioned
+    scale = max((t[-1] - t[0]) / max(n - 1, 1) * max(window // 2, 1), np.finfo(float).tiny)
+    coefficients = np.empty((n, order + 1))
+    hankel = np.add.outer(np.arange(order + 1), np.arange(order + 1))
+    # The normal equations only need the power sums of x and x * y, built up
+    # one power at a time over cache-sized blocks of points
+    for first in range(0, n, 1 << 14):
+        rows = start[first:first + (1 << 14), None] + np.arange(window)
+        x = (t[rows] - t[first:first + len(rows), None]) / scale
+        values = y[rows]
+        power = np.ones_like(x)
+        sums = np.empty((len(rows), 2 * order + 1))
+        moments = np.empty((len(rows), order + 1))
+        for k in range(2 * order + 1):
+            sums[:, k] = power.sum(axis=1)
+            if k <= order:
+                moments[:, k] = (power * values).sum(axis=1)
+            power *= x
+        coefficients[first:first + len(rows)] = np.linalg.solve(sums[:, hankel], moments[..., None])[..., 0]
+    position = coefficients[:, 0]
+    velocity = coefficients[:, 1] / scale if order >= 1 else np.gradient(position, t)
+    acceleration = 2 * coefficients[:, 2] / scale ** 2 if order >= 2 else np.gradient(velocity, t)
+    return position, velocity, acceleration
+
+
+def _solve_pentadiagonal(d0, d1, d2, b):
+    """Solve a symmetric positive-definite pentadiagonal system by banded LDL^T in O(n)."""
+    m = len(d0)
+    d0, d1, d2, b = d0.tolist(), d1.tolist() + [0.0, 0.0], d2.tolist() + [0.0, 0.0], b.tolist()
+    D, l1, l2 = [0.0] * m, [0.0] * (m + 2), [0.0] * (m + 2)
+    z = [0.0] * m
+    D_1 = D_2 = l1_1 = l2_1 = l2_2 = z_1 = z_2 = 0.0
+    for i in range(m):
+        Di = d0[i] - l1_1 * l1_1 * D_1 - l2_2 * l2_2 * D_2
+        D[i] = Di
+        l1[i] = (d1[i] - l2_1 * l1_1 * D_1) / Di
+        l2[i] = d2[i] / Di
+        zi = b[i] - l1_1 * z_1 - l2_2 * z_2
+        z[i] = zi
+        D_2, D_1 = D_1, Di
+        l2_2, l2_1 = l2_1, l2[i]
+        l1_1 = l1[i]
+        z_2, z_1 = z_1, zi
+    x = [0.0] * (m + 2)
+    for i in range(m - 1, -1, -1):
+        x[i] = z[i] / D[i] - l1[i] * x[i + 1] - l2[i] * x[i + 2]
+    return np.array(x[:m])
+
+
+def spline_derivatives(t, y, smoothing=100.0):
+    """Cubic smoothing spline (Reinsch) and its exact first and second derivatives.
+
+    Minimizes sum((y - g)^2) + lam * integral(g''^2) with lam = smoothing
+    times the cube of the mean sample spacing, through one pentadiagonal
+    solve in O(n).
+    """
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    h = np.diff(t)
+    lam = smoothing * h.mean() ** 3
+    # Column j of Q (knot j + 1) holds a, b, c at rows j, j + 1, j + 2
+    a, c = 1 / h[:-1], 1 / h[1:]
+    b = -a - c
+    d0 = (h[:-1] + h[1:]) / 3 + lam * (a ** 2 + b ** 2 + c ** 2)
+    d1 = h[1:-1] / 6 + lam * (b[:-1] * a[1:] + c[:-1] * b[1:])
+    d2 = lam * c[:-2] * a[2:]
+    rhs = a * y[:-2] + b * y[1:-1] + c * y[2:]
+    gamma = _solve_pentadiagonal(d0, d1, d2, rhs)
+
+    q_gamma = np.zeros_like(y)
+    q_gamma[:-2] += a * gamma
+    q_gamma[1:-1] += b * gamma
+    q_gamma[2:] += c * gamma
+    position = y - lam * q_gamma
+    acceleration = np.concatenate([[0.0], gamma, [0.0]])
+    slope = np.diff(position) / h
+    velocity = np.empty_like(y)
+    velocity[:-1] = slope - h * (2 * acceleration[:-1] + acceleration[1:]) / 6
+    velocity[-1] = slope[-1] + h[-1] * (acceleration[-2] + 2 * acceleration[-1]) / 6
+    return position, velocity, acceleration
+
+
+def _integrate(u, h):
+    out = np.zeros_like(u)
+    out[1:] = np.cumsum((u[1:] + u[:-1]) * h / 2)
+    return out
+
+
+def _integrate_adjoint(r, h):
+    tail = np.cumsum(r[::-1])[::-1]
+    out = np.zeros_like(r)
+    out[:-1] += h / 2 * tail[1:]
+    out[1:] += h / 2 * tail[1:]
+    return out
+
+
+def tv_derivatives(t, y, alpha=1e-6, order=2, iterations=10, cg_iterations=100, epsilon=1e-6):
+    """Total-variation regularized differentiation (Chartrand's method, operator form).
+
+    Finds the `order`-th derivative u (2 = acceleration) whose `order`-fold
+    trapezoidal integral, plus a free polynomial of degree order - 1, best
+    matches y, with alpha * TV(u) as penalty, so u comes out piecewise
+    constant with sharp steps. Time and y are normalized first, so `alpha` is
+    dimensionless. Lagged diffusivity: each of `iterations` reweighted
+    quadratic problems is solved by conjugate gradients whose operator is a
+    handful of cumulative sums, O(n) per step.
+    """
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    duration = t[-1] - t[0]
+    tau = (t - t[0]) / duration
+    h = np.diff(tau)
+    y_scale = y.std() or 1.0
+    f = (y - y.mean()) / y_scale
+
+    def integrate(u, times=order):
+        for _ in range(times):
+            u = _integrate(u, h)
+        return u
+
+    def integrate_adjoint(r):
+        for _ in range(order):
+            r = _integrate_adjoint(r, h)
+        return r
+
+    basis = tau[:, None] ** np.arange(order)
+    q, _ = np.linalg.qr(basis)
+
+    def project(r):
+        return r - q @ (q.T @ r)
+
+    rhs = integrate_adjoint(project(f))
+    u = np.zeros_like(f)
+    weights = np.ones(len(f) - 1)
+    for _ in range(iterations):
+        def apply(v):
+            return alpha * -np.diff(np.concatenate([[0.0], weights * np.diff(v), [0.0]])) + integrate_adjoint(project(integrate(v)))
+
+        residual = rhs - apply(u)
+        direction = residual.copy()
+        rr = residual @ residual
+        for _ in range(cg_iterations):
+            if rr <= 1e-20 * (rhs @ rhs):
+                break
+            step = apply(direction)
+            step_size = rr / (direction @ step)
+            u += step_size * direction
+            residual -= step_size * step
+            rr, rr_old = residual @ residual, rr
+            direction = residual + rr / rr_old * direction
+        weights = 1 / np.sqrt(np.diff(u) ** 2 + epsilon)
+
+    coefficients = np.linalg.lstsq(basis, f - integrate(u), rcond=None)[0]
+    position = (basis @ coefficients + integrate(u)) * y_scale + y.mean()
+    derivative = u * y_scale / duration ** order
+    if order == 1:
+        return position, derivative, np.gradient(derivative, t)
+    velocity = (coefficients[1] + integrate(u, order - 1)) * y_scale / duration if order == 2 else np.gradient(position, t)
+    return position, velocity, derivative
+
+
+# Differentiation methods by display name, with their tunable parameters and defaults;
+# the first is the default, and the global polynomial fit is only kept for comparison
+DIFFERENTIATORS = {
+    'Savitzky-Golay': (savgol_derivatives, {'window': 21, 'order': 3}),
+    'Smoothing spline': (spline_derivatives, {'smoothing': 100.0}),
+    'Total variation': (tv_derivatives, {'alpha': 1e-6, 'order': 2}),
+    'Polynomial fit': (polyfit_derivatives, {'degree': 40, 'window': 5}),
+}
+
+
+def differentiate(t, y, method='Savitzky-Golay', **params):
+    """Position, velocity and acceleration of y(t) with a method from DIFFERENTIATORS.
+
+    Samples sharing a time stamp (common in PLC trends) are averaged before
+    smoothing and the results are mapped back to every original sample.
+    """
+    function, defaults = DIFFERENTIATORS[method]
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if np.all(np.diff(t) > 0):
+        return function(t, y, **{**defaults, **params})
+    t_unique, inverse = np.unique(t, return_inverse=True)
+    y_unique = np.bincount(inverse, weights=y) / np.bincount(inverse)
+    return tuple(values[inverse] for values in function(t_unique, y_unique, **{**defaults, **params}))
+
+
+def benchmark_differentiators(num_samples=450, noise=0.005, seed=0, methods=None):
+    """Accuracy and speed of each method on a synthetic compaction stroke with known derivatives.
+
+    The stroke is a logistic 15 mm drop over 1550-2000 ms, sampled at jittered
+    (non-uniform) times with Gaussian noise of `noise` mm. Errors are RMS over
+    the middle 90% of the samples, to leave out edge effects.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.sort(1550 + 450 * (np.arange(num_samples) + rng.uniform(0.1, 0.9, num_samples)) / num_samples)
+    center, width, travel = 1800.0, 15.0, 15.0
+    s = 1 / (1 + np.exp(-(t - center) / width))
+    truth = (20 - travel * s, -travel * s * (1 - s) / width, -travel * s * (1 - s) * (1 - 2 * s) / width ** 2)
+    y = truth[0] + rng.normal(0, noise, num_samples)
+    inner = slice(num_samples // 20, num_samples - num_samples // 20)
+
+    rows = []
+    for method in methods or DIFFERENTIATORS:
+        start = time.perf_counter()
+        estimates = differentiate(t, y, method)
+        elapsed = time.perf_counter() - start
+        errors = [np.sqrt(np.nanmean((estimate[inner] - exact[inner]) ** 2)) for estimate, exact in zip(estimates, truth)]
+        rows.append({
+            'Method': method,
+            'Position RMSE (mm)': errors[0],
+            'Velocity RMSE (mm/ms)': errors[1],
+            'Acceleration RMSE (mm/ms^2)': errors[2],
+            'Time (ms)': 1000 * elapsed,
+        })
+    return pd.DataFrame(rows)
+
+
+# Compaction-stroke detection, so analyses follow the machine timing instead of fixed windows
+def detect_strokes(t, y, window=21, threshold=0.1, rest=0.02, padding=25.0, min_duration=10.0, min_travel=0.1, direction=-1):
+    """Every compaction stroke in a trace of any length, one row per stroke.
+
+    The trace is smoothed and differentiated once (Savitzky-Golay, O(n)).
+    A stroke is a run where the speed rises above `threshold` times the
+    trace's peak speed (99.5th percentile, so a single spike does not set
+    the scale); its start and end are where the speed falls back below
+    `rest` times that scale, i.e. where the pin changes from rest to motion
+    and back. Runs shorter than `min_duration` ms or `min_travel` mm are
+    dropped (the latter keeps sensor noise on an idle trace out), and with
+    `direction` -1 / +1 only strokes that decrease / increase the reading
+    are kept (None keeps both). 'Window Start/End (ms)' add `padding` ms on
+    both sides to include the impact and keep smoothing edges off the stroke.
+    """
+    columns = ['Stroke', 'Start (ms)', 'End (ms)', 'Window Start (ms)', 'Window End (ms)', 'Travel (mm)', 'Peak Speed (mm/ms)']
+    t = np.asarray(t, dtype=float)
+    fitted, velocity, _ = differentiate(t, y, 'Savitzky-Golay', window=window)
+    speed = np.abs(velocity)
+    scale = np.nanpercentile(speed, 99.5) if len(speed) else 0.0
+    if not scale > 0:
+        return pd.DataFrame(columns=columns)
+
+    moving = speed > rest * scale
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], moving.astype(np.int8), [0]])))
+    starts, stops = edges[0::2], edges[1::2] - 1
+    if not len(starts):
+        return pd.DataFrame(columns=columns)
+    # Fast samples only occur inside moving runs, so per-run sums need no run ends
+    fast_samples = np.add.reduceat((speed > threshold * scale).astype(int), starts)
+    peak_speed = np.maximum.reduceat(speed, starts)
+    travel = fitted[stops] - fitted[starts]
+    keep = (fast_samples > 0) & (t[stops] - t[starts] >= min_duration) & (np.abs(travel) >= min_travel)
+    if direction:
+        keep &= np.sign(travel) == np.sign(direction)
+    starts, stops = starts[keep], stops[keep]
+    return pd.DataFrame({
+        'Stroke': np.arange(1, len(starts) + 1),
+        'Start (ms)': t[starts],
+        'End (ms)': t[stops],
+        'Window Start (ms)': t[starts] - padding,
+        'Window End (ms)': t[stops] + padding,
+        'Travel (mm)': travel[keep],
+        'Peak Speed (mm/ms)': peak_speed[keep],
+    }, columns=columns)
+
+
+def stroke_segment(data, stroke, time_column='Milisecond'):
+    """Rows of `data` inside one detected stroke's padded window."""
+    return data[data[time_column].between(stroke['Window Start (ms)'], stroke['Window End (ms)'])].copy()
+
+
+# Force analysis of one compaction shot (pneumatic cylinder driving the compaction pin)
+def compute_metrics(data, pressure, bore_size, mass, method='Savitzky-Golay', params=None, peak_range=None):
+    """Compute metrics based on input data and parameters.
+
+    The inertial peak is searched within `peak_range` (ms), or over all of
+    `data` when it is a single detected stroke.
+    """
+    # Cubic fit without velocity smoothing unless told otherwise (reduced from 40 to 3)
+    params = {'degree': 3, 'window': 1, **(params or {})} if method == 'Polynomial fit' else (params or {})
+    fitted, velocity, acceleration = differentiate(data['Milisecond'], data['Compaction (mm)'], method, **params)
+    data['Fitted Compaction (mm)'] = fitted
+    data['Fitted Velocity (mm/ms)'] = -velocity
+    data['Fitted Acceleration (mm/ms^2)'] = -acceleration
+
+    P = pressure * 6894.76  # Convert psi to Pa
+    r = bore_size / 2 / 1000  # Convert mm to m
+    A = np.pi * r**2  # Area in m^2
+    F_pneumatic = P * A  # Force in N
+
+    data['Fitted Inertial Force (N)'] = mass * data['Fitted Acceleration (mm/ms^2)'] * 1000  # Convert mm/ms^2 to m/s^2
+
+    range_data = data if peak_range is None else data[data['Milisecond'].between(*peak_range)]
+    peak_inertia_force = range_data['Fitted Inertial Force (N)'].min()  # Finding the largest negative force
+    peak_total_force = abs(F_pneumatic) + abs(peak_inertia_force)  # Summing absolute values of the forces
+
+    return data, F_pneumatic, peak_inertia_force, peak_total_force
+
+
+def tip_pressure_psi(peak_total_force, tip_diameter_thou):
+    """Pressure on the compaction pin tip (psi) for a force in N and a pin diameter in thou."""
+    tip_area_in2 = np.pi * (tip_diameter_thou * 0.001 / 2)**2
+    return peak_total_force * 0.2248 / tip_area_in2  # Convert N to lbs
+
+
+def analyze_trace(name, source, pressure, bore_size, mass, tip_diameter_thou, method='Savitzky-Golay', params=None, detector=None):
+    """Summary rows, one per detected stroke, for one trace file (path or raw bytes).
+
+    `detector` holds keyword arguments for detect_strokes. Failures are
+    reported in 'Error' instead of raised.
+    """
+    try:
+        data = read_excel_cached(source)
+        strokes = detect_strokes(data['Milisecond'], data['Compaction (mm)'], **(detector or {}))
+        if strokes.empty:
+            raise ValueError('no compaction stroke detected')
+        rows = []
+        for _, stroke in strokes.iterrows():
+            segment, F_pneumatic, peak_inertia_force, peak_total_force = compute_metrics(stroke_segment(data, stroke), pressure, bore_size, mass, method, params)
+            peak_row = segment['Fitted Inertial Force (N)'].idxmin()
+            rows.append({
+                'File': name,
+                'Stroke': stroke['Stroke'],
+                'Stroke Start (ms)': stroke['Start (ms)'],
+                'Peak Total Force (N)': peak_total_force,
+                'Peak Inertial Force (N)': peak_inertia_force,
+                'Tip Pressure (psi)': tip_pressure_psi(peak_total_force, tip_diameter_thou),
+                'Time of Peak (ms)': segment.loc[peak_row, 'Milisecond'],
+                'Error': None,
+            })
+        return rows
+    except Exception as error:
+        return [{'File': name, 'Error': f'{type(error).__name__}: {error}'}]
+
+
+def trace_files(directory, pattern='*.xlsx'):
+    """(name, path) pairs for the trace files in a directory, sorted by name."""
+    return [(path.name, str(path)) for path in sorted(Path(directory).glob(pattern))]
+
+
+def analyze_traces(traces, pressure, bore_size, mass, tip_diameter_thou, method='Savitzky-Golay', params=None, detector=None, max_workers=None):
+    """Summary table of many (name, path-or-bytes) traces, one file per process-pool task.
+
+    Each file contributes one row per detected stroke. A file that cannot be
+    read or analyzed gets a row with only its 'Error' filled in; the rest of
+    the batch is unaffected.
+    """
+    columns = ['File', 'Stroke', 'Stroke Start (ms)', 'Peak Total Force (N)', 'Peak Inertial Force (N)', 'Tip Pressure (psi)', 'Time of Peak (ms)', 'Error']
+    if not traces:
+        return pd.DataFrame(columns=columns)
+    names, sources = zip(*traces)
+    settings = [[value] * len(traces) for value in (pressure, bore_size, mass, tip_diameter_thou, method, params, detector)]
+    with ProcessPoolExecutor(max_workers=min(max_workers or os.cpu_count(), len(traces))) as pool:
+        rows = [row for file_rows in pool.map(analyze_trace, names, sources, *settings, chunksize=max(1, len(traces) // (4 * (os.cpu_count() or 1)))) for row in file_rows]
+    return pd.DataFrame(rows, columns=columns)
+
+
+
+# Level of detail for charts: a browser cannot show more points than the
+# chart has pixels, so long traces are decimated before they are plotted.
+def minmax_indices(y, num_buckets):
+    """Indices of the minimum and maximum of each of `num_buckets` equal-count buckets, in order."""
+    n = len(y)
+    size = -(-n // num_buckets)
+    padded = np.full(num_buckets * size, np.nan)
+    padded[:n] = y
+    buckets = padded.reshape(num_buckets, size)
+    valid = ~np.isnan(buckets).all(axis=1)
+    low = np.where(np.isnan(buckets), np.inf, buckets).argmin(axis=1)
+    high = np.where(np.isnan(buckets), -np.inf, buckets).argmax(axis=1)
+    offsets = np.arange(num_buckets) * size
+    indices = np.stack([np.minimum(low, high), np.maximum(low, high)], axis=1) + offsets[:, None]
+    return np.unique(indices[valid].ravel())
+
+
+def lttb_indices(x, y, num_points):
+    """Largest-Triangle-Three-Buckets: indices of `num_points` samples that keep the visual shape.
+
+    The first and last samples are always kept; each bucket in between
+    contributes the sample forming the largest triangle with the sample
+    kept from the previous bucket and the mean of the next one.
+    """
+    n = len(x)
+    if num_points >= n or num_points < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, num_points - 1).astype(int)
+    means_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / np.diff(edges)
+    means_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / np.diff(edges)
+    means_x = np.append(means_x, x[-1])
+    means_y = np.append(means_y, y[-1])
+    kept = np.empty(num_points, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(num_points - 2):
+        candidates = slice(edges[bucket], edges[bucket + 1])
+        area = np.abs((x[previous] - means_x[bucket + 1]) * (y[candidates] - y[previous])
+                      - (x[previous] - x[candidates]) * (means_y[bucket + 1] - y[previous]))
+        previous = edges[bucket] + int(np.nanargmax(area)) if np.isfinite(area).any() else edges[bucket]
+        kept[bucket + 1] = previous
+    return kept
+
+
+def decimate(x, y, max_points=2000, x_range=None):
+    """(x, y) cut to `x_range` and reduced to at most `max_points` samples for plotting.
+
+    The samples just outside the range are kept so lines run to the edges.
+    Min-max bucketing first brings long traces down to 4 * max_points
+    (keeping every spike), then LTTB picks the final points.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if x_range is not None:
+        first, last = np.searchsorted(x, x_range[0]), np.searchsorted(x, x_range[1], side='right')
+        x, y = x[max(first - 1, 0):last + 1], y[max(first - 1, 0):last + 1]
+    if len(x) <= max_points:
+        return x, y
+    if len(x) > 4 * max_points:
+        kept = minmax_indices(y, 2 * max_points)
+        x, y = x[kept], y[kept]
+    kept = lttb_indices(x, np.nan_to_num(y, nan=np.nanmean(y)), max_points)
+    return x[kept], y[kept]
+
+
+@st.cache_data(max_entries=64)
+def chart_data(frame, x, y, x_range, max_points):
+    """Decimated `x` and `y` columns of `frame` for one chart, cached by the frame's content."""
+    x_values, y_values = decimate(frame[x], frame[y], max_points, x_range)
+    return pd.DataFrame({x: x_values, y: y_values})
+
+# Live monitoring: samples from a growing CSV or a UDP socket go into a fixed-size
+# ring buffer, and derivatives are computed only for the samples that arrive.
+STREAM_COLUMNS = ['time', 'compaction', 'fitted', 'velocity', 'acceleration', 'inertial_force']
+
+
+def new_stream(capacity=20000, window=21, order=3, mass=0.5):
+    """Empty ring buffer of `capacity` samples, one NumPy array per column in STREAM_COLUMNS.
+
+    Derivatives come from a centered Savitzky-Golay fit over `window`
+    samples, so a sample's velocity, acceleration and inertial force are
+    final (no longer NaN) once window // 2 newer samples have arrived.
+    Signs follow compute_metrics: positive velocity moves the pin down.
+    """
+    return {
+        'columns': {name: np.full(capacity, np.nan) for name in STREAM_COLUMNS},
+        'count': 0,
+        'finalized': 0,
+        'window': window,
+        'order': order,
+        'mass': mass,
+    }
+
+
+def _ring_indices(stream, start, stop):
+    return np.arange(start, stop) % len(stream['columns']['time'])
+
+
+def push_samples(stream, t, y):
+    """Append samples and finish the derivatives of every sample whose window is now complete.
+
+    Only the new samples plus `window` older ones are fitted, whatever the
+    buffer size.
+    """
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    columns = stream['columns']
+    capacity = len(columns['time'])
+    window, half = stream['window'], stream['window'] // 2
+    chunk = max(capacity - 2 * window, 1)
+    for first in range(0, len(t), chunk):
+        count = stream['count']
+        new = slice(first, first + chunk)
+        rows = _ring_indices(stream, count, count + len(t[new]))
+        columns['time'][rows] = t[new]
+        columns['compaction'][rows] = y[new]
+        for name in STREAM_COLUMNS[2:]:
+            columns[name][rows] = np.nan
+        count = stream['count'] = count + len(rows)
+
+        # Samples [finalized, ready) now have `half` samples after them; the
+        # oldest ones may already be overwritten if a push outran the buffer
+        ready = count - half
+        start = max(stream['finalized'], count - capacity + window, 0)
+        if ready <= start or count < window:
+            continue
+        context = max(start - half, count - capacity, 0)
+        span = _ring_indices(stream, context, count)
+        fitted, velocity, acceleration = savgol_derivatives(columns['time'][span], columns['compaction'][span], window, stream['order'])
+        keep = slice(start - context, ready - context)
+        rows = span[keep]
+        columns['fitted'][rows] = fitted[keep]
+        columns['velocity'][rows] = -velocity[keep]
+        columns['acceleration'][rows] = -acceleration[keep]
+        columns['inertial_force'][rows] = stream['mass'] * -acceleration[keep] * 1000  # Convert mm/ms^2 to m/s^2
+        stream['finalized'] = ready
+
+
+def stream_frame(stream, last=None):
+    """The newest `last` samples (all buffered ones by default) as a DataFrame in arrival order."""
+    count = stream['count']
+    size = min(count, len(stream['columns']['time']), last or count)
+    rows = _ring_indices(stream, count - size, count)
+    return pd.DataFrame({name: column[rows] for name, column in stream['columns'].items()})
+
+
+def csv_source(path, time_column='Milisecond', value_column='Compaction (mm)'):
+    """Tail state for a CSV file that a logger keeps appending to (header on the first line)."""
+    return {'path': path, 'offset': 0, 'columns': None, 'time_column': time_column, 'value_column': value_column}
+
+
+def poll_csv(source):
+    """(t, y) of the complete lines appended since the last poll."""
+    try:
+        with open(source['path'], 'rb') as handle:
+            handle.seek(source['offset'])
+            chunk = handle.read()
+    except FileNotFoundError:
+        return np.empty(0), np.empty(0)
+    end = chunk.rfind(b'\n') + 1  # leave a half-written last line for the next poll
+    if end == 0:
+        return np.empty(0), np.empty(0)
+    source['offset'] += end
+    lines = chunk[:end]
+    if source['columns'] is None:
+        header, _, lines = lines.partition(b'\n')
+        source['columns'] = header.decode().strip().split(',')
+    if not lines.strip():
+        return np.empty(0), np.empty(0)
+    table = pd.read_csv(io.BytesIO(lines), header=None, names=source['columns'])
+    return table[source['time_column']].to_numpy(float), table[source['value_column']].to_numpy(float)
+
+
+def udp_source(host='127.0.0.1', port=5005):
+    """Non-blocking UDP socket receiving datagrams of "time,value" lines."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((host, port))
+    sock.setblocking(False)
+    return {'socket': sock}
+
+
+def poll_udp(source, max_datagrams=10000):
+    """(t, y) of the datagrams queued since the last poll."""
+    payload = []
+    for _ in range(max_datagrams):
+        try:
+            payload.append(source['socket'].recv(65536))
+        except BlockingIOError:
+            break
+    if not payload:
+        return np.empty(0), np.empty(0)
+    values = np.array(b'\n'.join(datagram.strip() for datagram in payload).replace(b'\n', b',').split(b','), dtype=float)
+    return values[0::2], values[1::2]
@@ -1,52 +1,172 @@
+import io
+import os
+
 import streamlit as st
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
-def compute_metrics(data, pressure, bore_size, mass):
-    """Compute metrics based on input data and parameters."""
-    coefficients = np.polyfit(data['Milisecond'], data['Compaction (mm)'], 3)  # Reduced from 40 to 3
-    polynomial_fit = np.poly1d(coefficients)
-    data['Fitted Compaction (mm)'] = polynomial_fit(data['Milisecond'])
+from compaction_engine import DIFFERENTIATORS, analyze_traces, chart_data, compute_metrics, csv_source, decimate, detect_strokes, new_stream, poll_csv, poll_udp, push_samples, stream_frame, stroke_segment, tip_pressure_psi, trace_files, udp_source
+from ingest_cache import read_excel_cached
 
-    data['Fitted Velocity (mm/ms)'] = -data['Fitted Compaction (mm)'].diff() / data['Milisecond'].diff()
-    data['Fitted Acceleration (mm/ms^2)'] = data['Fitted Velocity (mm/ms)'].diff() / data['Milisecond'].diff()
+# Stroke detection reruns only when the trace or the detector settings change
+cached_strokes = st.cache_data(max_entries=64)(detect_strokes)
 
-    P = pressure * 6894.76  # Convert psi to Pa
-    r = bore_size / 2 / 1000  # Convert mm to m
-    A = np.pi * r**2  # Area in m^2
-    F_pneumatic = P * A  # Force in N
 
-    data['Fitted Inertial Force (N)'] = mass * data['Fitted Acceleration (mm/ms^2)'] * 1000  # Convert mm/ms^2 to m/s^2
+def sidebar_parameters():
+    """Cylinder, tool and differentiation settings from the sidebar."""
+    pressure = st.sidebar.number_input("Pneumatic Pressure (psi)", min_value=0.0, value=65.0, step=0.1)
+    bore_size = st.sidebar.number_input("Cylinder Bore Size (mm)", min_value=0.0, value=12.0, step=0.1)
+    mass = st.sidebar.number_input("Mass of the tool (kg)", min_value=0.0, value=0.5, step=0.01)
+    tip_diameter_thou = st.sidebar.number_input("Compactor Pin Diameter (thou)", min_value=0.0, value=25.0, step=0.1)
 
-    range_data = data[(data['Milisecond'] >= 1700) & (data['Milisecond'] <= 1900)]
-    peak_inertia_force = range_data['Fitted Inertial Force (N)'].min()  # Finding the largest negative force
-    peak_total_force = abs(F_pneumatic) + abs(peak_inertia_force)  # Summing absolute values of the forces
-    
-    return data, F_pneumatic, peak_inertia_force, peak_total_force
+    # Smoothing / differentiation method; the polynomial fit defaults to the cubic used here before
+    method = st.sidebar.selectbox("Differentiation Method", list(DIFFERENTIATORS))
+    defaults = {**DIFFERENTIATORS[method][1], **({'degree': 3, 'window': 1} if method == 'Polynomial fit' else {})}
+    params = {
+        name: st.sidebar.number_input(f"{method}: {name}", value=default, format="%g" if isinstance(default, float) else "%d")
+        for name, default in defaults.items()
+    }
+    return pressure, bore_size, mass, tip_diameter_thou, method, params
+
+
+def detector_parameters():
+    """Compaction-stroke detection settings from the sidebar (see compaction_engine.detect_strokes)."""
+    st.sidebar.subheader("Stroke Detection")
+    direction = st.sidebar.selectbox("Compaction moves the reading", ["Down", "Up", "Either way"])
+    return {
+        'threshold': st.sidebar.number_input("Motion threshold (fraction of peak speed)", min_value=0.01, max_value=1.0, value=0.1, step=0.01),
+        'rest': st.sidebar.number_input("Rest threshold (fraction of peak speed)", min_value=0.001, max_value=1.0, value=0.02, step=0.005, format="%.3f"),
+        'padding': st.sidebar.number_input("Padding around each stroke (ms)", min_value=0.0, value=25.0, step=5.0),
+        'direction': {"Down": -1, "Up": 1, "Either way": None}[direction],
+    }
+
+
+def batch_analysis():
+    """Analyze many compaction shots at once and summarize the peak forces of each."""
+    uploaded_files = st.file_uploader("Choose Excel files", type="xlsx", accept_multiple_files=True)
+    directory = st.text_input("...or a folder with Excel files on the server")
+    pressure, bore_size, mass, tip_diameter_thou, method, params = sidebar_parameters()
+    detector = detector_parameters()
+
+    traces = [(uploaded.name, uploaded.getvalue()) for uploaded in uploaded_files or []]
+    if directory:
+        if os.path.isdir(directory):
+            traces += trace_files(directory)
+        else:
+            st.warning(f"Folder not found: {directory}")
+
+    if st.button(f"Analyze {len(traces)} files", disabled=not traces):
+        with st.spinner("Analyzing traces..."):
+            st.session_state.batch_summary = analyze_traces(traces, pressure, bore_size, mass, tip_diameter_thou, method, params, detector)
+
+    if 'batch_summary' in st.session_state:
+        summary = st.session_state.batch_summary
+        failed = summary['Error'].notna()
+        st.header("Summary:")
+        if failed.any():
+            st.warning(f"{failed.sum()} of {len(summary)} files could not be analyzed; see the Error column.")
+        st.dataframe(summary, hide_index=True, use_container_width=True)
+
+        excel, parquet = io.BytesIO(), io.BytesIO()
+        summary.to_excel(excel, index=False)
+        summary.to_parquet(parquet, index=False)
+        st.download_button("Download Summary (Excel)", excel.getvalue(), file_name="compaction_summary.xlsx")
+        st.download_button("Download Summary (Parquet)", parquet.getvalue(), file_name="compaction_summary.parquet")
+
+def live_monitoring():
+    """Follow a sensor trend as it is logged, with velocity, acceleration and inertial force."""
+    kind = st.sidebar.selectbox("Source", ["Growing CSV file", "UDP socket"])
+    if kind == "Growing CSV file":
+        path = st.sidebar.text_input("CSV file on the server", "trend.csv")
+    else:
+        port = st.sidebar.number_input("UDP port (datagrams of \"time,value\" lines)", min_value=1, max_value=65535, value=5005)
+    mass = st.sidebar.number_input("Mass of the tool (kg)", min_value=0.0, value=0.5, step=0.01)
+    window = st.sidebar.number_input("Savitzky-Golay window (samples)", min_value=5, value=21, step=2)
+    capacity = st.sidebar.number_input("Samples kept", min_value=1000, value=20000, step=1000)
+    shown = st.sidebar.number_input("Samples shown", min_value=100, value=5000, step=500)
+    refresh = st.sidebar.slider("Chart refresh interval (s)", min_value=0.2, max_value=5.0, value=1.0, step=0.1)
+    max_points = st.sidebar.number_input("Points per chart", min_value=100, value=1500, step=100)
+
+    start, stop = st.columns(2)
+    if start.button("Start", disabled='live' in st.session_state):
+        try:
+            source = csv_source(path) if kind == "Growing CSV file" else udp_source(port=port)
+        except OSError as e:
+            st.error(f"Could not open the source: {e}")
+            st.stop()
+        st.session_state.live = {
+            'stream': new_stream(capacity, window, mass=mass),
+            'source': source,
+            'poll': poll_csv if kind == "Growing CSV file" else poll_udp,
+        }
+    if stop.button("Stop", disabled='live' not in st.session_state):
+        live = st.session_state.pop('live')
+        if 'socket' in live['source']:
+            live['source']['socket'].close()
+    if 'live' not in st.session_state:
+        st.write("Choose a source in the sidebar and press Start.")
+        return
+
+    # Samples are ingested and the chart redrawn once per interval, however fast they arrive
+    @st.fragment(run_every=refresh)
+    def live_chart():
+        live = st.session_state.get('live')
+        if live is None:
+            return
+        push_samples(live['stream'], *live['poll'](live['source']))
+        frame = stream_frame(live['stream'], shown)
+        peak_inertia_force = frame['inertial_force'].min()
+        st.write(f"**Samples received**: {live['stream']['count']}")
+        st.write(f"**Peak Force due to Inertia** (shown window): {peak_inertia_force:.2f} N")
+        for column, title in [('fitted', 'Fitted Compaction (mm)'), ('velocity', 'Fitted Velocity (mm/ms)'), ('acceleration', 'Fitted Acceleration (mm/ms^2)'), ('inertial_force', 'Fitted Inertial Force (N)')]:
+            st.subheader(title)
+            # New samples arrive every run, so decimate directly instead of caching
+            times, values = decimate(frame['time'], frame[column], max_points)
+            st.line_chart(pd.Series(values, index=times, name=title))
+
+    live_chart()
 
 st.title("Pneumatic Cylinder Compaction Force Analysis")
 
+mode = st.sidebar.radio("Mode", ["Single trace", "Batch", "Live"])
+if mode == "Batch":
+    batch_analysis()
+    st.stop()
+if mode == "Live":
+    live_monitoring()
+    st.stop()
+
 uploaded_file = st.file_uploader("Choose an Excel file", type="xlsx")
 
 if uploaded_file:
     try:
-        data = pd.read_excel(uploaded_file)
+        data = read_excel_cached(uploaded_file)
         st.write("Data uploaded successfully!")
     except Exception as e:
         st.write("Error reading the uploaded file. Please ensure the file format and content are correct.")
         st.stop()
 
-    pressure = st.sidebar.number_input("Pneumatic Pressure (psi)", min_value=0.0, value=65.0, step=0.1)
-    bore_size = st.sidebar.number_input("Cylinder Bore Size (mm)", min_value=0.0, value=12.0, step=0.1)
-    mass = st.sidebar.number_input("Mass of the tool (kg)", min_value=0.0, value=0.5, step=0.01)
-    tip_diameter_thou = st.sidebar.number_input("Compactor Pin Diameter (thou)", min_value=0.0, value=25.0, step=0.1)
-    
-    focused_data = data[(data['Milisecond'] >= 1550) & (data['Milisecond'] <= 2000)].copy()
-    focused_data, F_pneumatic, peak_inertia_force, peak_total_force = compute_metrics(focused_data, pressure, bore_size, mass)
-    
-    # Check for NaN or Inf values after computation
-    if focused_data.isnull().values.any() or np.isinf(focused_data.values).any():
+    pressure, bore_size, mass, tip_diameter_thou, method, params = sidebar_parameters()
+    detector = detector_parameters()
+
+    # Find every compaction stroke in the trace and analyze the chosen one
+    strokes = cached_strokes(data['Milisecond'], data['Compaction (mm)'], **detector)
+    if strokes.empty:
+        st.write("No compaction stroke was detected. Try lower motion thresholds or a different direction in the sidebar.")
+        st.stop()
+    if len(strokes) > 1:
+        st.write(f"**{len(strokes)} compaction strokes detected:**")
+        st.dataframe(strokes, hide_index=True, use_container_width=True)
+    stroke = strokes.iloc[st.selectbox("Compaction stroke", strokes['Stroke']) - 1]
+    focused_data = stroke_segment(data, stroke)
+    focused_data, F_pneumatic, peak_inertia_force, peak_total_force = compute_metrics(focused_data, pressure, bore_size, mass, method, params)
+
+    metrics = ['Fitted Compaction (mm)', 'Fitted Velocity (mm/ms)', 'Fitted Acceleration (mm/ms^2)', 'Fitted Inertial Force (N)']
+
+    # Check for Inf values, or nothing left, after computation (finite differences leave NaN in the first rows)
+    computed = focused_data[metrics].dropna()
+    if computed.empty or np.isinf(computed.values).any():
         st.write("Error: The data contains NaN or Inf values after computation. Please check the input data or computations.")
         st.stop()
 
@@ -55,29 +175,31 @@ if uploaded_file:
     st.write(f"**Peak Force due to Inertia**: {peak_inertia_force:.2f} N")
     st.write(f"**Peak Total Force**: {peak_total_force:.2f} N")
     
-    tip_diameter_inches = tip_diameter_thou * 0.001
-    tip_area_in2 = np.pi * (tip_diameter_inches / 2)**2
-    peak_total_force_lbs = peak_total_force * 0.2248  # Convert N to lbs
-    pressure_tip_psi_corrected = peak_total_force_lbs / tip_area_in2
+    pressure_tip_psi_corrected = tip_pressure_psi(peak_total_force, tip_diameter_thou)
     st.write(f"**Pressure on the Compaction Pin Tip**: {pressure_tip_psi_corrected:.2f} PSI")
 
-    metrics = ['Fitted Compaction (mm)', 'Fitted Velocity (mm/ms)', 'Fitted Acceleration (mm/ms^2)', 'Fitted Inertial Force (N)']
     titles = ['Fitted Compaction (Distance) vs Time', 'Fitted Velocity vs Time', 'Fitted Acceleration vs Time', 'Fitted Inertial Force vs Time']
     colors = ['blue', 'green', 'red', 'purple']
 
-    all_values = np.concatenate([focused_data[metric].values for metric in metrics])
-    y_min = all_values.min()
-    y_max = all_values.max()
+    # Charts show the zoomed window with at most `max_points` points each; results above use every sample
+    max_points = st.sidebar.number_input("Points per chart", min_value=100, value=1500, step=100)
+    window = (float(stroke['Window Start (ms)']), float(stroke['Window End (ms)']))
+    zoom = st.slider("Zoom (ms)", min_value=window[0], max_value=window[1], value=window)
+    series = {metric: chart_data(focused_data, 'Milisecond', metric, zoom, max_points) for metric in metrics}
+
+    all_values = np.concatenate([series[metric][metric].to_numpy() for metric in metrics])
+    y_min = np.nanmin(all_values)
+    y_max = np.nanmax(all_values)
 
     for metric, title, color in zip(metrics, titles, colors):
         st.subheader(title)
         fig, ax = plt.subplots(figsize=(15, 6))
-        ax.plot(focused_data['Milisecond'], focused_data[metric], color=color)
+        ax.plot(series[metric]['Milisecond'], series[metric][metric], color=color)
         ax.axhline(0, color='gray', linewidth=0.5)
         ax.grid(True)
         ax.set_xlabel('Milisecond')
         ax.set_ylabel(metric)
-        ax.set_xlim(1600, 1950)
+        ax.set_xlim(*zoom)
         ax.set_ylim(y_min, y_max)
 
         # Adding a label for the computed peak force in the last graph
@@ -1,29 +1,29 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 import math
 import plotly.express as px
 
+from compaction_engine import DIFFERENTIATORS, benchmark_differentiators, chart_data, detect_strokes, differentiate
+from ingest_cache import read_excel_cached
 
-def process_data_within_range(data, pressure, bore_size, mass, tip_diameter, degree=40):
+
+def process_data_within_range(data, pressure, bore_size, mass, tip_diameter, method='Savitzky-Golay', params=None, time_range=(1550, 2000)):
     """Process the data within the specified time range and compute required metrics."""
     
     # Convert Time and Milisecond columns to a single time in milliseconds
     data['Total Time (ms)'] = data['Milisecond']
     
     # Select data within the desired range
-    focused_data = data[(data['Total Time (ms)'] >= 1550) & (data['Total Time (ms)'] <= 2000)].copy()
-    
+    focused_data = data[data['Total Time (ms)'].between(*time_range)].copy()
     
-    # Apply polynomial fit
-    coefficients = np.polyfit(focused_data['Total Time (ms)'], focused_data['Compaction (mm)'], degree)
-    poly = np.poly1d(coefficients)
-    focused_data['Fitted Compaction (mm)'] = poly(focused_data['Total Time (ms)'])
     
-    # Compute velocity and acceleration from the fitted compaction data
+    # Smooth the compaction trace and differentiate it with the chosen method (see compaction_engine.DIFFERENTIATORS)
+    fitted, velocity, acceleration = differentiate(focused_data['Total Time (ms)'], focused_data['Compaction (mm)'], method, **(params or {}))
+    focused_data['Fitted Compaction (mm)'] = fitted
+    # Raw finite-difference velocity of the fitted trace, next to the differentiator's smoothed one
     focused_data['Velocity (mm/ms)'] = focused_data['Fitted Compaction (mm)'].diff() / focused_data['Total Time (ms)'].diff()
-    focused_data['Smoothed Velocity (mm/ms)'] = focused_data['Velocity (mm/ms)'].rolling(window=5).mean()
-    focused_data['Smoothed Acceleration (mm/ms^2)'] = focused_data['Smoothed Velocity (mm/ms)'].diff() / focused_data['Total Time (ms)'].diff()
+    focused_data['Smoothed Velocity (mm/ms)'] = velocity
+    focused_data['Smoothed Acceleration (mm/ms^2)'] = acceleration
     
     # Calculate forces
     P = pressure * 6894.76  # Pressure in Pascals (from psi to Pa)
@@ -80,6 +80,8 @@ def modified_process_data(data, pressure, bore_size, mass, tip_diameter):
     return data, F_pneumatic, pressure_tip_psi, max_force
 
 
+# Stroke detection reruns only when the trace or the detector settings change
+cached_strokes = st.cache_data(max_entries=64)(detect_strokes)
 
 
 st.title("Pneumatic Cylinder Compaction Force Analysis")
@@ -93,9 +95,10 @@ This application processes data from a PLC trend on an IL-100 distance sensor ob
 The main objective is to determine the peak force the cylinder exerts on powder during compaction.
 
 #### Modifications:
-- **Data Range Focus**: The analysis concentrates on the time range from 1550ms to 2000ms to focus on the main portion of the compaction event.
-- **Polynomial Fit**: A 40th-degree polynomial fit has been applied to the 'Compaction (mm)' data within this time range.
-- **Recalculated Metrics**: Metrics like velocity, acceleration, and forces have been recalculated based on the polynomial-fitted data.
+- **Stroke Detection**: Instead of a fixed 1550ms to 2000ms window, every compaction stroke in the trace is found from the smoothed displacement: a stroke is where the pin speed exceeds a fraction of the trace's peak speed, extended to where the pin comes back to rest, plus some padding. Long traces with many shots can be analyzed stroke by stroke.
+- **Smoothing and Differentiation**: The 'Compaction (mm)' data within this time range is smoothed and differentiated with the method chosen in the sidebar: a Savitzky–Golay filter (the default), a cubic smoothing spline, or a total-variation regularized derivative. All three handle uneven sample spacing directly and scale linearly with the number of samples. The original 40th-degree polynomial fit is still available for comparison, but it oscillates near the ends of the window and is not recommended; the benchmark at the bottom of the page compares their accuracy and speed.
+- **Recalculated Metrics**: Metrics like velocity, acceleration, and forces have been recalculated based on the smoothed data.
+- **Chart Level of Detail**: Charts show the window chosen with the zoom slider, reduced to at most the number of points set in the sidebar (min-max bucketing, then Largest-Triangle-Three-Buckets), so peaks survive and million-sample traces stay responsive. Results are always computed from every sample.
 
 #### Key Metrics and Calculations:
 
@@ -147,7 +150,7 @@ uploaded_file = st.file_uploader("Choose an Excel file", type="xlsx")
 
 if uploaded_file:
     try:
-        data = pd.read_excel(uploaded_file)
+        data = read_excel_cached(uploaded_file)
         st.write("Data uploaded successfully!")
     except Exception as e:
         st.write("Error reading the uploaded file. Please ensure the file format and content are correct.")
@@ -160,8 +163,29 @@ if uploaded_file:
     mass = st.sidebar.number_input("Mass of the tool (kg)", min_value=0.0, value=0.5, step=0.01)
     tip_diameter = st.sidebar.number_input("Compactor Pin Diameter (thou)", min_value=0.0, value=25.0, step=0.1) * 0.0254  # in meters
 
+    # Smoothing / differentiation method and its parameters
+    method = st.sidebar.selectbox("Differentiation Method", list(DIFFERENTIATORS))
+    params = {
+        name: st.sidebar.number_input(f"{method}: {name}", value=default, format="%g" if isinstance(default, float) else "%d")
+        for name, default in DIFFERENTIATORS[method][1].items()
+    }
+
+    # Compaction strokes in the trace (see compaction_engine.detect_strokes)
+    st.sidebar.subheader("Stroke Detection")
+    direction = st.sidebar.selectbox("Compaction moves the reading", ["Down", "Up", "Either way"])
+    padding = st.sidebar.number_input("Padding around each stroke (ms)", min_value=0.0, value=25.0, step=5.0)
+    strokes = cached_strokes(data['Milisecond'], data['Compaction (mm)'], padding=padding, direction={"Down": -1, "Up": 1, "Either way": None}[direction])
+    if strokes.empty:
+        st.write("No compaction stroke was detected. Try a different direction in the sidebar.")
+        st.stop()
+    if len(strokes) > 1:
+        st.write(f"**{len(strokes)} compaction strokes detected:**")
+        st.dataframe(strokes, hide_index=True, use_container_width=True)
+    stroke = strokes.iloc[st.selectbox("Compaction stroke", strokes['Stroke']) - 1]
+    time_range = (stroke['Window Start (ms)'], stroke['Window End (ms)'])
+
      # Process data and calculate forces
-    focused_data, F_pneumatic, pressure_tip_psi, max_force = process_data_within_range(data, pressure, bore_size, mass, tip_diameter)
+    focused_data, F_pneumatic, pressure_tip_psi, max_force = process_data_within_range(data, pressure, bore_size, mass, tip_diameter, method=method, params=params, time_range=time_range)
 
 
 
@@ -179,28 +203,29 @@ if uploaded_file:
 
 
    
-    # Interactive Plotting using plotly
+    # Interactive Plotting using plotly; each chart gets at most `max_points` points of the zoomed window
+    max_points = st.sidebar.number_input("Points per chart", min_value=100, value=1500, step=100)
+    zoom = st.slider("Zoom (ms)", min_value=float(time_range[0]), max_value=float(time_range[1]), value=(float(time_range[0]), float(time_range[1])))
     
     # Fitted Compaction (Distance) vs Time
-    fig1 = px.line(data, x='Total Time (ms)', y='Compaction (mm)', title='Fitted Compaction (Distance) vs Time', range_x=[1550, 2000])
+    fig1 = px.line(chart_data(focused_data, 'Total Time (ms)', 'Fitted Compaction (mm)', zoom, max_points), x='Total Time (ms)', y='Fitted Compaction (mm)', title='Fitted Compaction (Distance) vs Time', range_x=list(zoom))
     st.plotly_chart(fig1)
     
     # Velocity vs Time
-    fig2 = px.line(data, x='Total Time (ms)', y='Velocity (mm/ms)', title='Velocity vs Time', range_x=[1550, 2000])
+    fig2 = px.line(chart_data(focused_data, 'Total Time (ms)', 'Velocity (mm/ms)', zoom, max_points), x='Total Time (ms)', y='Velocity (mm/ms)', title='Velocity vs Time', range_x=list(zoom))
     st.plotly_chart(fig2)
     
     # Acceleration vs Time
-    fig3 = px.line(data, x='Total Time (ms)', y='Smoothed Acceleration (mm/ms^2)', title='Acceleration vs Time', range_x=[1550, 2000])
+    fig3 = px.line(chart_data(focused_data, 'Total Time (ms)', 'Smoothed Acceleration (mm/ms^2)', zoom, max_points), x='Total Time (ms)', y='Smoothed Acceleration (mm/ms^2)', title='Acceleration vs Time', range_x=list(zoom))
     st.plotly_chart(fig3)
     
     # Total Force vs Time
-    fig3 = px.line(data, x='Total Time (ms)', y='Total Force (N)', title='Total Force vs Time', range_x=[1550, 2000])
+    fig3 = px.line(chart_data(focused_data, 'Total Time (ms)', 'Total Force (N)', zoom, max_points), x='Total Time (ms)', y='Total Force (N)', title='Total Force vs Time', range_x=list(zoom))
     
-    # Find the time corresponding to the max_force within the 1950ms to 2000ms range
-    peak_range = data[(data['Total Time (ms)'] >= 1950) & (data['Total Time (ms)'] <= 2000)]
-    max_force_time = peak_range['Total Time (ms)'][peak_range['Total Force (N)'].idxmax()]
+    # Find the time corresponding to the max_force within the stroke
+    max_force_time = focused_data['Total Time (ms)'][focused_data['Total Force (N)'].idxmax()]
     
-    # Annotate the peak total force in the range 1950ms to 2000ms
+    # Annotate the peak total force of the stroke
     fig3.add_annotation(
             x=max_force_time,
             y=max_force,
@@ -212,6 +237,13 @@ if uploaded_file:
         )
     st.plotly_chart(fig3)
 
+    # Accuracy and speed of the differentiation methods on a synthetic stroke with known derivatives
+    with st.expander("Differentiation Method Benchmark"):
+        samples = st.number_input("Samples in the synthetic stroke", min_value=50, value=450, step=50)
+        noise = st.number_input("Sensor noise (mm)", min_value=0.0, value=0.005, step=0.001, format="%.3f")
+        if st.button("Run Benchmark"):
+            st.dataframe(benchmark_differentiators(samples, noise), hide_index=True)
+
 
 
 else:
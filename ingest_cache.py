@@ -0,0 +1,94 @@
+import contextlib
+import hashlib
+import io
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+
+# Parsed uploads are kept as Parquet files named by the hash of the uploaded
+# bytes, so a workbook is parsed by openpyxl once and later reruns (and other
+# sessions) read the columns back memory-mapped.
+CACHE_DIR = Path(os.environ.get('INGEST_CACHE_DIR', Path(tempfile.gettempdir()) / 'streamlit_ingest_cache'))
+MAX_CACHE_BYTES = int(os.environ.get('INGEST_CACHE_MAX_BYTES', 2 * 1024**3))
+
+
+def _source_bytes(source):
+    """Raw bytes of an uploaded file, a binary buffer, bytes or a path."""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if isinstance(source, (str, os.PathLike)):
+        return Path(source).read_bytes()
+    if hasattr(source, 'getvalue'):
+        return source.getvalue()
+    source.seek(0)
+    return source.read()
+
+
+def content_key(data, sheet_name=0):
+    """Cache key for the given bytes and sheet."""
+    h = hashlib.blake2b(data, digest_size=16)
+    h.update(repr(sheet_name).encode())
+    return h.hexdigest()
+
+
+def _evict(cache_dir, max_bytes):
+    """Delete the least recently used entries until the cache fits in `max_bytes`."""
+    entries = []
+    for path in cache_dir.glob('*.parquet'):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+
+def read_excel_cached(source, sheet_name=0, cache_dir=None, max_bytes=None, **kwargs):
+    """pd.read_excel of a single sheet through the on-disk cache.
+
+    A hit reads the memory-mapped Parquet file and marks it as recently used;
+    a miss parses the workbook, writes the entry atomically (other sessions
+    and worker processes share the directory) and evicts the least recently
+    used entries beyond `max_bytes`. Frames Parquet cannot hold (e.g. mixed
+    types in one column) are returned uncached.
+    """
+    cache_dir = Path(cache_dir or CACHE_DIR)
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    data = _source_bytes(source)
+    path = cache_dir / f'{content_key(data, (sheet_name, sorted(kwargs.items())))}.parquet'
+    try:
+        table = pd.read_parquet(path, memory_map=True)
+    except (OSError, ImportError):
+        pass
+    else:
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        return table
+
+    table = pd.read_excel(io.BytesIO(data), sheet_name=sheet_name, **kwargs)
+    temporary = None
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=cache_dir, suffix='.tmp', delete=False) as handle:
+            temporary = Path(handle.name)
+        table.to_parquet(temporary)
+        os.replace(temporary, path)
+        _evict(cache_dir, max_bytes)
+    except (ImportError, ValueError, TypeError, OSError):
+        if temporary:
+            temporary.unlink(missing_ok=True)
+    return table
+
+
+def clear_cache(cache_dir=None):
+    """Remove every cached entry."""
+    for path in Path(cache_dir or CACHE_DIR).glob('*.parquet'):
+        path.unlink(missing_ok=True)
@@ -0,0 +1,799 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+# Material library: layers whose 'Material' matches an entry get n(lambda) + i k(lambda)
+# instead of the constant 'Refractive index n'. Tabulated materials are CSV files
+# in MATERIALS_DIR (columns 'Wavelength (nm)', 'n' and optional 'k') or a session's
+# own uploaded tables, passed explicitly as `materials` (lower-case name -> MaterialTable).
+MATERIALS_DIR = Path(__file__).resolve().parent / 'materials'
+
+# Sellmeier coefficients (B_i, C_i in um^2): n^2 = 1 + sum(B_i lambda^2 / (lambda^2 - C_i))
+SELLMEIER_MODELS = {
+    'SiO2': ((0.6961663, 0.4079426, 0.8974794), (0.0684043 ** 2, 0.1162414 ** 2, 9.896161 ** 2)),
+    'BK7': ((1.03961212, 0.231792344, 1.01046945), (0.00600069867, 0.0200179144, 103.560653)),
+    'MgF2': ((0.48755108, 0.39875031, 2.3120353), (0.04338408 ** 2, 0.09461442 ** 2, 23.793604 ** 2)),
+    'Al2O3': ((1.4313493, 0.65054713, 5.3414021), (0.0726631 ** 2, 0.1193242 ** 2, 18.028251 ** 2)),
+}
+
+# Cauchy coefficients (A, B in um^2): n = A + B / lambda^2
+CAUCHY_MODELS = {
+    'K5': (1.5220, 0.00459),
+    'BaK4': (1.5690, 0.00531),
+    'BaF10': (1.6700, 0.00743),
+    'SF10': (1.7280, 0.01342),
+}
+
+def sellmeier_index(wavelengths, B, C):
+    lambda_sq = (np.asarray(wavelengths, dtype=float) / 1000) ** 2
+    return np.sqrt(1 + sum(b * lambda_sq / (lambda_sq - c) for b, c in zip(B, C))).astype(complex)
+
+
+def cauchy_index(wavelengths, A, B):
+    lambda_um = np.asarray(wavelengths, dtype=float) / 1000
+    return (A + B / lambda_um ** 2).astype(complex)
+
+
+def tabulated_index(wavelengths, table):
+    table = table.sort_values('Wavelength (nm)')
+    n = np.interp(wavelengths, table['Wavelength (nm)'], table['n'])
+    k = np.interp(wavelengths, table['Wavelength (nm)'], table['k']) if 'k' in table else 0.0
+    return n + 1j * k
+
+
+def _material_sources():
+    sources = {name.lower(): (name, 'sellmeier') for name in SELLMEIER_MODELS}
+    sources.update({name.lower(): (name, 'cauchy') for name in CAUCHY_MODELS})
+    if MATERIALS_DIR.is_dir():
+        sources.update({path.stem.lower(): (path.stem, path) for path in MATERIALS_DIR.glob('*.csv')})
+    return sources
+
+
+def available_materials(materials=None):
+    return sorted({name for name, _ in _material_sources().values()} | {table.name for table in (materials or {}).values()})
+
+
+class MaterialTable:
+    """An uploaded n, k table, hashed and compared by content.
+
+    Identical uploads (across reruns or sessions) share their resampled grids
+    in the LRU cache, so nothing is ever invalidated.
+    """
+
+    def __init__(self, name, table):
+        self.name = name.strip()
+        self.table = table
+        self.digest = _digest(pd.util.hash_pandas_object(table), np.asarray(table.columns, dtype=str))
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __eq__(self, other):
+        return isinstance(other, MaterialTable) and self.digest == other.digest
+
+
+@lru_cache(maxsize=256)
+def _resampled_index(key, grid_bytes, grid_shape):
+    wavelengths = np.frombuffer(grid_bytes).reshape(grid_shape)
+    name, source = _material_sources()[key]
+    if source == 'sellmeier':
+        values = sellmeier_index(wavelengths, *SELLMEIER_MODELS[name])
+    elif source == 'cauchy':
+        values = cauchy_index(wavelengths, *CAUCHY_MODELS[name])
+    else:
+        values = tabulated_index(wavelengths, pd.read_csv(source))
+    values.setflags(write=False)
+    return values
+
+
+@lru_cache(maxsize=256)
+def _resampled_table(material, grid_bytes, grid_shape):
+    values = tabulated_index(np.frombuffer(grid_bytes).reshape(grid_shape), material.table)
+    values.setflags(write=False)
+    return values
+
+
+def material_index(material, wavelengths, materials=None):
+    """n + i k of a library material on `wavelengths` (None if not in the library).
+
+    Tables in `materials` take precedence over the built-in library. Each
+    material is resampled once per wavelength grid and kept in an LRU cache.
+    """
+    key = str(material).strip().lower()
+    wavelengths = np.ascontiguousarray(wavelengths, dtype=float)
+    if materials and key in materials:
+        return _resampled_table(materials[key], wavelengths.tobytes(), wavelengths.shape)
+    if key not in _material_sources():
+        return None
+    return _resampled_index(key, wavelengths.tobytes(), wavelengths.shape)
+
+
+def layer_indices(layers, wavelengths=None, materials=None):
+    """Per-layer index: the library n(lambda) for known materials, else 'Refractive index n'."""
+    indices = list(np.asarray(layers['Refractive index n'], dtype=complex))
+    if wavelengths is None or 'Material' not in layers:
+        return indices
+    for material, rows in layers.groupby('Material', sort=False).indices.items():
+        values = material_index(material, wavelengths, materials)
+        if values is not None:
+            for row in rows:
+                indices[row] = values
+    return indices
+
+
+# Stack arrays (ambient + layers + substrate) built once from the layers table;
+# with `wavelengths`, library materials make n_values a (layers + 2, samples) array
+def stack_from_dataframe(layers, n_substrate, n_ambient=1.0, wavelengths=None, materials=None):
+    n_values = np.stack(np.broadcast_arrays(n_ambient, *layer_indices(layers, wavelengths, materials), n_substrate)).astype(complex)
+    d_values = np.concatenate(([np.inf], np.asarray(layers['Thickness (nm)'], dtype=float), [np.inf]))
+    return n_values, d_values
+
+
+# Fresnel coefficients for oblique incidence, broadcast over any array arguments
+def fresnel_coefficients(n1, n2, theta1, polarization="s"):
+    n1 = np.asarray(n1, dtype=complex)
+    n2 = np.asarray(n2, dtype=complex)
+    theta1 = np.asarray(theta1, dtype=complex)
+    theta2 = np.arcsin(n1 * np.sin(theta1) / n2)  # Snell's law
+    if polarization == "s":
+        return (n1 * np.cos(theta1) - n2 * np.cos(theta2)) / (n1 * np.cos(theta1) + n2 * np.cos(theta2))
+    # p-polarized
+    return (n2 * np.cos(theta1) - n1 * np.cos(theta2)) / (n2 * np.cos(theta1) + n1 * np.cos(theta2))
+
+
+# Phase shift accumulated across one layer
+def phase_shift(n, d, lambda_):
+    return 2 * np.pi * n * d / lambda_
+
+
+# exp(1j * phase); lossless layers take the cheaper real cos/sin route
+def unit_phasor(phase):
+    phase = np.asarray(phase)
+    if np.iscomplexobj(phase) and np.any(phase.imag):
+        return np.exp(1j * phase)
+    phase = phase.real
+    phasor = np.empty(phase.shape, dtype=complex)
+    np.cos(phase, out=phasor.real)
+    np.sin(phase, out=phasor.imag)
+    return phasor
+
+
+def layer_term(n_values, d_values, i, wavelengths, theta_incidence=0.0, polarization="s"):
+    """Term r_i * exp(2j * phi_i) contributed by layer `i` (1-based, as in `n_values`)."""
+    sin_theta = np.sin(np.deg2rad(np.asarray(theta_incidence, dtype=float)))
+    theta_i = np.arcsin(np.asarray(n_values[i - 1] * sin_theta, dtype=complex) / n_values[i])  # Snell's law
+    r_i = fresnel_coefficients(n_values[i], n_values[i + 1], theta_i, polarization)
+    return r_i * unit_phasor(2 * phase_shift(n_values[i], d_values[i], wavelengths))
+
+
+def layer_terms(n_values, d_values, wavelengths, theta_incidence=0.0, polarization="s"):
+    """Return the entry reflection r_01 and the per-layer terms r_i * exp(2j * phi_i).
+
+    `n_values` may hold scalars or arrays broadcastable against `wavelengths`
+    (dispersive materials); `theta_incidence` is in degrees and may itself be an
+    array broadcastable against `wavelengths`.
+    """
+    wavelengths = np.asarray(wavelengths, dtype=float)
+    theta = np.deg2rad(np.asarray(theta_incidence, dtype=float))
+    r_entry = fresnel_coefficients(n_values[0], n_values[1], theta, polarization)
+    terms = [layer_term(n_values, d_values, i, wavelengths, theta_incidence, polarization) for i in range(1, len(n_values) - 1)]
+    return r_entry, terms
+
+
+def reflection_coefficient(n_values, d_values, wavelengths, theta_incidence=0.0, polarization="s"):
+    """Complex reflection coefficient for every sample of `wavelengths` in one pass.
+
+    Applies the same layer-by-layer recursion as `total_reflectance_oblique`,
+    r <- (r + r_i e^{2j phi_i}) / (1 + r r_i e^{2j phi_i}), with each step
+    vectorized over all wavelengths (and angles, if given as an array).
+    """
+    r_entry, terms = layer_terms(n_values, d_values, wavelengths, theta_incidence, polarization)
+    shape = np.broadcast_shapes(np.shape(wavelengths), np.shape(theta_incidence), np.shape(r_entry))
+    r = np.broadcast_to(r_entry, shape).astype(complex)
+    numerator = np.empty(shape, dtype=complex)
+    for term in terms:
+        np.add(r, term, out=numerator)
+        r *= term
+        r += 1
+        np.divide(numerator, r, out=r)
+    return r
+
+
+def reflectance(n_values, d_values, wavelengths, theta_incidence=0.0, polarization="s"):
+    r = reflection_coefficient(n_values, d_values, wavelengths, theta_incidence, polarization)
+    return np.abs(r) ** 2
+
+
+# Memory budget for batched angle x wavelength evaluations
+MAP_MEMORY_BUDGET_BYTES = 256 * 1024 ** 2
+
+
+def reflectance_map(coefficient, wavelengths, angles, terms_per_sample, polarizations=("s", "p"), memory_budget=MAP_MEMORY_BUDGET_BYTES):
+    """R(theta, lambda) for every polarization, plus the unpolarized average.
+
+    `coefficient(wavelengths, theta_incidence, polarization)` evaluates the
+    stack, e.g. `partial(reflection_coefficient, n_values, d_values)`. Angles
+    are broadcast against wavelengths as a (len(angles), len(wavelengths))
+    grid and processed in row chunks sized so the `terms_per_sample` complex
+    arrays held by one pass stay under `memory_budget` bytes.
+    """
+    wavelengths = np.asarray(wavelengths, dtype=float)
+    angles = np.asarray(angles, dtype=float)
+    bytes_per_row = (terms_per_sample + 2) * wavelengths.size * np.dtype(complex).itemsize
+    rows_per_chunk = max(1, int(memory_budget // bytes_per_row))
+    maps = {pol: np.empty((angles.size, wavelengths.size)) for pol in polarizations}
+    for start in range(0, angles.size, rows_per_chunk):
+        chunk = angles[start:start + rows_per_chunk, np.newaxis]
+        for pol in polarizations:
+            maps[pol][start:start + chunk.shape[0]] = np.abs(coefficient(wavelengths, chunk, pol)) ** 2
+    if "s" in maps and "p" in maps:
+        maps["unpolarized"] = (maps["s"] + maps["p"]) / 2
+    return maps
+
+
+# Each recursion step r <- (r + a) / (1 + r a) is the Mobius map of the layer
+# matrix [[1, a], [a, 1]], so runs of layers compose as 2x2 matrix products.
+def mobius_step(r, term):
+    return (r + term) / (1 + r * term)
+
+
+def apply_mobius(matrix, r):
+    return (matrix[0, 0] * r + matrix[0, 1]) / (matrix[1, 0] * r + matrix[1, 1])
+
+
+def compose_layer(matrix, term):
+    """matrix @ [[1, term], [term, 1]], rescaled per sample (Mobius maps ignore scale)."""
+    product = np.stack([
+        np.stack([matrix[0, 0] + matrix[0, 1] * term, matrix[0, 0] * term + matrix[0, 1]]),
+        np.stack([matrix[1, 0] + matrix[1, 1] * term, matrix[1, 0] * term + matrix[1, 1]]),
+    ])
+    return product / np.abs(product).max(axis=(0, 1))
+
+
+def mobius_product(a, b):
+    """a @ b for stacks of 2x2 matrices of shape (2, 2, *samples), rescaled per sample."""
+    product = np.einsum('ij...,jk...->ik...', a, b)
+    return product / np.abs(product).max(axis=(0, 1))
+
+
+def mobius_power(matrix, exponent):
+    """matrix ** exponent by repeated squaring: O(log exponent) products."""
+    result = None
+    while exponent:
+        if exponent & 1:
+            result = matrix if result is None else mobius_product(result, matrix)
+        exponent >>= 1
+        if exponent:
+            matrix = mobius_product(matrix, matrix)
+    return result
+
+
+def _digest(*values):
+    h = hashlib.blake2b(digest_size=16)
+    for value in values:
+        h.update(np.ascontiguousarray(value).tobytes())
+    return h.hexdigest()
+
+
+def incremental_reflection_coefficient(cache, n_values, d_values, wavelengths, theta_incidence=0.0, polarization="s"):
+    """`reflection_coefficient` that only rebuilds the layers changed since the last call.
+
+    `cache` is a plain dict kept between calls (e.g. in `st.session_state`). It
+    holds every layer term keyed by a hash of the values it depends on, and a
+    balanced product tree of the layer Mobius matrices: each leaf is one
+    layer, each node the product of its two children (later layers on the
+    left) and the root the whole stack. An edit to any layer recomputes its
+    leaf and the log2(layers) nodes above it, so it costs O(samples * log
+    layers) wherever it is; a change to the entry interface only reapplies
+    the root. Any change to the grid, angle, polarization or layer count
+    triggers a full rebuild.
+    """
+    wavelengths = np.asarray(wavelengths, dtype=float)
+    num_layers = len(n_values) - 2
+    grid_key = _digest(wavelengths, np.asarray(theta_incidence, dtype=float), np.frombuffer(polarization.encode(), dtype=np.uint8), np.asarray(num_layers))
+    entry_key = _digest(n_values[0], n_values[1])
+    layer_keys = [_digest(n_values[i - 1], n_values[i], n_values[i + 1], d_values[i]) for i in range(1, num_layers + 1)]
+
+    if cache.get('grid_key') != grid_key:
+        r_entry, terms = layer_terms(n_values, d_values, wavelengths, theta_incidence, polarization)
+        shape = np.broadcast_shapes(wavelengths.shape, np.shape(theta_incidence), np.shape(r_entry), *[np.shape(t) for t in terms])
+        leaves = 1 << max(num_layers - 1, 0).bit_length()
+        tree = np.empty((2 * leaves, 2, 2) + shape, dtype=complex)
+        tree[leaves:] = np.eye(2).reshape((2, 2) + (1,) * len(shape))
+        for j, term in enumerate(terms):
+            tree[leaves + j, 0, 1] = tree[leaves + j, 1, 0] = term
+        level = leaves
+        while level > 1:
+            right, left = tree[level + 1:2 * level:2], tree[level:2 * level:2]
+            product = right[:, :, :1] * left[:, np.newaxis, 0] + right[:, :, 1:] * left[:, np.newaxis, 1]
+            tree[level // 2:level] = product / np.abs(product).max(axis=(1, 2), keepdims=True)
+            level //= 2
+        cache.clear()
+        cache.update(grid_key=grid_key, entry_key=entry_key, layer_keys=layer_keys, r_entry=np.broadcast_to(r_entry, shape).astype(complex), tree=tree)
+        cache['r'] = apply_mobius(tree[1], cache['r_entry'])
+        return cache['r']
+
+    changed = [j for j, key in enumerate(layer_keys) if key != cache['layer_keys'][j]]
+    if entry_key != cache['entry_key']:
+        cache['r_entry'] = np.broadcast_to(fresnel_coefficients(n_values[0], n_values[1], np.deg2rad(theta_incidence), polarization), cache['r_entry'].shape).astype(complex)
+        cache['entry_key'] = entry_key
+    elif not changed:
+        return cache['r']
+
+    tree = cache['tree']
+    leaves = len(tree) // 2
+    for j in changed:
+        tree[leaves + j] = _layer_matrix(np.broadcast_to(layer_term(n_values, d_values, j + 1, wavelengths, theta_incidence, polarization), tree.shape[3:]))
+        cache['layer_keys'][j] = layer_keys[j]
+    nodes = {(leaves + j) // 2 for j in changed if leaves + j > 1}
+    while nodes:
+        for i in nodes:
+            tree[i] = mobius_product(tree[2 * i + 1], tree[2 * i])
+        nodes = {i // 2 for i in nodes if i > 1}
+    cache['r'] = apply_mobius(tree[1], cache['r_entry'])
+    return cache['r']
+
+
+def _layer_matrix(term):
+    # [[1, term], [term, 1]]: the Mobius matrix of one recursion step
+    one = np.ones_like(term)
+    return np.stack([np.stack([one, term]), np.stack([term, one])])
+
+
+# Periodic stacks: a list of blocks (n_cell, d_cell, repeats), e.g. caps + (H L)^N
+def block_repeats(layers):
+    """'Repeats' of every row as integers; blank cells (e.g. on the cap layers) count as 1.
+
+    Raises ValueError naming the rows whose value is not a positive integer.
+    """
+    if 'Repeats' not in layers:
+        return pd.Series(1, index=layers.index)
+    repeats = pd.to_numeric(layers['Repeats'], errors='coerce').where(layers['Repeats'].notna(), 1)
+    bad = repeats.isna() | (repeats < 1) | (repeats != repeats.round())
+    if bad.any():
+        rows = ', '.join(f"{position + 1} ({layers['Repeats'].iloc[position]})" for position in np.flatnonzero(bad.to_numpy()))
+        raise ValueError(f"'Repeats' must be a positive integer; check rows {rows}")
+    return repeats.astype(int)
+
+
+def blocks_from_dataframe(layers, wavelengths=None, materials=None):
+    """Group a layers table into periodic blocks.
+
+    Consecutive rows sharing a 'Block' label form one unit cell, repeated as
+    many times as the 'Repeats' value on the block's first row. Without a
+    'Block' column the whole table is one cell; without 'Repeats', or with
+    the cell left blank, it is used once.
+    """
+    labels = layers['Block'] if 'Block' in layers else pd.Series(0, index=layers.index)
+    repeats = block_repeats(layers)
+    group_ids = (labels != labels.shift()).cumsum()
+    blocks = []
+    for _, rows in layers.groupby(group_ids, sort=False):
+        blocks.append((
+            np.stack(np.broadcast_arrays(*layer_indices(rows.reset_index(drop=True), wavelengths, materials))),
+            np.asarray(rows['Thickness (nm)'], dtype=float),
+            int(repeats[rows.index[0]]),
+        ))
+    return blocks
+
+
+def _block_terms(n_before, n_cell, d_cell, n_after, wavelengths, theta_incidence, polarization):
+    n_values = np.stack(np.broadcast_arrays(n_before, *n_cell, n_after))
+    d_values = np.concatenate(([np.inf], d_cell, [np.inf]))
+    return [layer_term(n_values, d_values, i, wavelengths, theta_incidence, polarization) for i in range(1, len(n_values) - 1)]
+
+
+def periodic_reflection_coefficient(n_ambient, blocks, n_substrate, wavelengths, theta_incidence=0.0, polarization="s"):
+    """Reflection coefficient of a stack given as periodic blocks.
+
+    Gives the same result as `reflection_coefficient` on the expanded stack.
+    The first and last repeat of each block see their real neighbours and are
+    stepped explicitly; the identical inner repeats collapse into one cell
+    matrix raised to the power repeats - 2, so a 10,000-period mirror costs
+    O(log N) matrix products per wavelength instead of O(N) layers.
+    """
+    wavelengths = np.asarray(wavelengths, dtype=float)
+    blocks = [block for block in blocks if block[2] > 0 and len(block[0]) > 0]
+    firsts = [n_cell[0] for n_cell, _, _ in blocks] + [n_substrate]
+    lasts = [n_ambient] + [n_cell[-1] for n_cell, _, _ in blocks]
+    r = fresnel_coefficients(n_ambient, firsts[0], np.deg2rad(np.asarray(theta_incidence, dtype=float)), polarization)
+    r = np.broadcast_to(r, np.broadcast_shapes(wavelengths.shape, np.shape(theta_incidence), np.shape(r))).astype(complex)
+
+    for b, (n_cell, d_cell, repeats) in enumerate(blocks):
+        n_before, n_after = lasts[b], firsts[b + 1]
+        if repeats == 1:
+            for term in _block_terms(n_before, n_cell, d_cell, n_after, wavelengths, theta_incidence, polarization):
+                r = mobius_step(r, term)
+            continue
+        for term in _block_terms(n_before, n_cell, d_cell, n_cell[0], wavelengths, theta_incidence, polarization):
+            r = mobius_step(r, term)
+        if repeats > 2:
+            cell = np.eye(2).reshape((2, 2) + (1,) * r.ndim)
+            for term in reversed(_block_terms(n_cell[-1], n_cell, d_cell, n_cell[0], wavelengths, theta_incidence, polarization)):
+                cell = compose_layer(cell, term)
+            r = apply_mobius(mobius_power(cell, repeats - 2), r)
+        for term in _block_terms(n_cell[-1], n_cell, d_cell, n_after, wavelengths, theta_incidence, polarization):
+            r = mobius_step(r, term)
+    return r
+
+
+def table_reflection_coefficient(layers, n_substrate, n_ambient, wavelengths, theta_incidence=0.0, polarization="s", materials=None):
+    """Reflection coefficient of a layers table, resolving library materials on `wavelengths`."""
+    if 'Repeats' in layers:
+        return periodic_reflection_coefficient(n_ambient, blocks_from_dataframe(layers, wavelengths, materials), n_substrate, wavelengths, theta_incidence, polarization)
+    n_values, d_values = stack_from_dataframe(layers, n_substrate, n_ambient, wavelengths, materials)
+    return reflection_coefficient(n_values, d_values, wavelengths, theta_incidence, polarization)
+
+
+def coefficient_from_dataframe(layers, n_substrate, n_ambient=1.0, materials=None):
+    """Evaluator (wavelengths, theta_incidence, polarization) -> r for a layers table.
+
+    Tables with a 'Repeats' column go through the periodic fast path. Also
+    returns the number of complex arrays one evaluation holds per sample, for
+    memory budgeting.
+    """
+    if 'Repeats' in layers:
+        terms_per_sample = max([len(block[0]) for block in blocks_from_dataframe(layers)], default=0) + 8
+    else:
+        terms_per_sample = len(layers) + 2
+    return partial(table_reflection_coefficient, layers, n_substrate, n_ambient, materials=materials), terms_per_sample
+
+
+def adaptive_spectrum(evaluate, lambda_min, lambda_max, tolerance=1e-3, initial_samples=128, max_samples=4000, min_step=None):
+    """Sample `evaluate(wavelengths) -> R` on [lambda_min, lambda_max] adaptively.
+
+    Starts from a coarse uniform grid and, one vectorized batch per level,
+    bisects every interval whose midpoint deviates from the linear
+    interpolation of its ends by more than `tolerance`. The intervals around
+    the global peak and minimum keep being bisected down to `min_step`
+    (default: 1e-6 of the range) so the reported extrema are located precisely.
+    Returns the sorted wavelengths and reflectance.
+    """
+    if min_step is None:
+        min_step = (lambda_max - lambda_min) * 1e-6
+    x = np.linspace(lambda_min, lambda_max, initial_samples)
+    y = evaluate(x)
+    active = np.ones(x.size - 1, dtype=bool)
+    while active.any() and x.size < max_samples:
+        idx = np.flatnonzero(active)
+        left, right = x[idx], x[idx + 1]
+        mid = (left + right) / 2
+        y_mid = evaluate(mid)
+        split = (np.abs(y_mid - (y[idx] + y[idx + 1]) / 2) > tolerance) & ((right - left) / 2 > min_step)
+
+        x = np.insert(x, idx + 1, mid)
+        y = np.insert(y, idx + 1, y_mid)
+        children = idx + np.arange(idx.size)
+        active = np.zeros(x.size - 1, dtype=bool)
+        active[children] = split
+        active[children + 1] = split
+
+        # Keep refining both intervals around the current peak and minimum
+        widths = np.diff(x)
+        for extremum in (np.argmax(y), np.argmin(y)):
+            for interval in (extremum - 1, extremum):
+                if 0 <= interval < widths.size and widths[interval] > min_step:
+                    active[interval] = True
+    return x, y
+
+
+# Band-averaged reflectance (trapezoidal, valid for non-uniform grids)
+def band_average(wavelengths, reflectance):
+    if len(wavelengths) < 2:
+        return float(np.mean(reflectance))
+    return float(np.sum(np.diff(wavelengths) * (reflectance[1:] + reflectance[:-1]) / 2) / (wavelengths[-1] - wavelengths[0]))
+
+
+# Inverse design: fit layer thicknesses to a target R(lambda)
+def expanded_layers(layers):
+    """Layers table with every periodic block written out row by row."""
+    if 'Repeats' not in layers:
+        return layers[['Material', 'Refractive index n', 'Thickness (nm)']].reset_index(drop=True)
+    labels = layers['Block'] if 'Block' in layers else pd.Series(0, index=layers.index)
+    repeats = block_repeats(layers)
+    group_ids = (labels != labels.shift()).cumsum()
+    parts = [pd.concat([rows] * repeats[rows.index[0]]) for _, rows in layers.groupby(group_ids, sort=False)]
+    return pd.concat(parts)[['Material', 'Refractive index n', 'Thickness (nm)']].reset_index(drop=True)
+
+
+def reflectance_and_gradient(n_values, d_values, wavelengths, theta_incidence=0.0, polarization="s"):
+    """R(lambda) and its analytic gradient dR/dd_i, shape (num_layers, samples).
+
+    The forward recursion keeps every state s_k; a backward adjoint pass then
+    applies the chain rule through r <- (s + t) / (1 + s t), whose partials are
+    (1 - t^2) / (1 + s t)^2 in s and (1 - s^2) / (1 + s t)^2 in t, and
+    dt_i/dd_i = t_i * 4j * pi * n_i / lambda.
+    """
+    wavelengths = np.asarray(wavelengths, dtype=float)
+    r_entry, terms = layer_terms(n_values, d_values, wavelengths, theta_incidence, polarization)
+    num_layers = len(terms)
+    shape = np.broadcast_shapes(wavelengths.shape, np.shape(theta_incidence), np.shape(r_entry))
+    states = np.empty((num_layers + 1,) + shape, dtype=complex)
+    states[0] = r_entry
+    for k, term in enumerate(terms):
+        states[k + 1] = mobius_step(states[k], term)
+    r = states[num_layers]
+
+    gradient = np.empty((num_layers,) + shape)
+    adjoint = np.ones(shape, dtype=complex)
+    for k in range(num_layers - 1, -1, -1):
+        term, state = terms[k], states[k]
+        denominator = (1 + state * term) ** 2
+        dr_dd = adjoint * (1 - state ** 2) / denominator * term * 4j * np.pi * n_values[k + 1] / wavelengths
+        gradient[k] = 2 * np.real(np.conj(r) * dr_dd)
+        adjoint = adjoint * (1 - term ** 2) / denominator
+    return np.abs(r) ** 2, gradient
+
+
+def band_target(lambda_min, lambda_max, band_min, band_max, r_in_band, r_out_of_band, samples=400):
+    """Target table for a simple reflect (or pass) band, in the schema `fit_design` expects."""
+    wavelengths = np.linspace(lambda_min, lambda_max, samples)
+    in_band = (wavelengths >= band_min) & (wavelengths <= band_max)
+    return pd.DataFrame({
+        'Wavelength (nm)': wavelengths,
+        'Target Reflectance': np.where(in_band, r_in_band, r_out_of_band),
+        'Weight': 1.0,
+    })
+
+
+def fit_thicknesses(n_values, d_start, wavelengths, target, weights, theta_incidence=0.0, polarization="s", thickness_bounds=(5.0, 500.0), iterations=300, learning_rate=2.0):
+    """Weighted least-squares fit of the layer thicknesses by projected Adam.
+
+    Returns the fitted thicknesses and the merit sum(w (R - T)^2) / sum(w).
+    """
+    d = np.clip(np.asarray(d_start, dtype=float), *thickness_bounds)
+    weights = weights / weights.sum()
+    m = np.zeros_like(d)
+    v = np.zeros_like(d)
+    beta1, beta2, eps = 0.9, 0.999, 1e-12
+    best_d, best_merit = d.copy(), np.inf
+    for step in range(1, iterations + 1):
+        d_values = np.concatenate(([np.inf], d, [np.inf]))
+        R, dR = reflectance_and_gradient(n_values, d_values, wavelengths, theta_incidence, polarization)
+        residual = R - target
+        merit = float(np.sum(weights * residual ** 2))
+        if merit < best_merit:
+            best_d, best_merit = d.copy(), merit
+        grad = dR @ (2 * weights * residual)
+        m = beta1 * m + (1 - beta1) * grad
+        v = beta2 * v + (1 - beta2) * grad ** 2
+        m_hat = m / (1 - beta1 ** step)
+        v_hat = v / (1 - beta2 ** step)
+        d = np.clip(d - learning_rate * m_hat / (np.sqrt(v_hat) + eps), *thickness_bounds)
+    return best_d, best_merit
+
+
+def _fit_start(args):
+    n_values, d_start, wavelengths, target, weights, theta_incidence, polarization, thickness_bounds, iterations = args
+    return fit_thicknesses(n_values, d_start, wavelengths, target, weights, theta_incidence, polarization, thickness_bounds, iterations)
+
+
+def fit_design(layers, n_substrate, target, theta_incidence=0.0, polarization="s", n_starts=16, thickness_bounds=(5.0, 500.0), iterations=300, keep=5, seed=0, max_workers=None, materials=None):
+    """Multi-start thickness optimization of a stack against a target spectrum.
+
+    `target` has 'Wavelength (nm)', 'Target Reflectance' and optional 'Weight'
+    columns. Materials and indices come from `layers`; the first start is the
+    current design and the rest are drawn uniformly within `thickness_bounds`
+    from independent seeds. Starts run in a process pool across all cores.
+    Returns the `keep` best designs as (merit, layers table) pairs, best first,
+    in the uploader's 'Material' / 'Refractive index n' / 'Thickness (nm)' schema.
+    """
+    layers = expanded_layers(layers)
+    wavelengths = np.asarray(target['Wavelength (nm)'], dtype=float)
+    n_values, d_values = stack_from_dataframe(layers, n_substrate, wavelengths=wavelengths, materials=materials)
+    target_r = np.asarray(target['Target Reflectance'], dtype=float)
+    weights = np.asarray(target['Weight'], dtype=float) if 'Weight' in target else np.ones_like(wavelengths)
+
+    starts = [d_values[1:-1]]
+    for child in np.random.SeedSequence(seed).spawn(n_starts - 1):
+        starts.append(np.random.default_rng(child).uniform(*thickness_bounds, size=len(layers)))
+    jobs = [(n_values, d_start, wavelengths, target_r, weights, theta_incidence, polarization, thickness_bounds, iterations) for d_start in starts]
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+        results = list(pool.map(_fit_start, jobs))
+
+    designs = []
+    for d, merit in sorted(results, key=lambda result: result[1])[:keep]:
+        design = layers.copy()
+        design['Thickness (nm)'] = d
+        designs.append((merit, design))
+    return designs
+
+
+# Monte Carlo tolerance analysis
+def tolerance_analysis(layers, n_substrate, wavelengths, thickness_sigma=0.02, index_sigma=0.01, trials=2000, theta_incidence=0.0, polarization="s", spec=None, seed=0, memory_budget=MAP_MEMORY_BUDGET_BYTES, materials=None):
+    """Spread of R(lambda) when every layer thickness and index vary randomly.
+
+    Each trial scales every layer's thickness by (1 + thickness_sigma * N(0, 1))
+    and its index by (1 + index_sigma * N(0, 1)). A chunk of trials is one
+    batched evaluation: the stack arrays get a trial axis of shape (trials, 1)
+    that broadcasts against the wavelengths, and chunks are sized to stay under
+    `memory_budget` bytes. `spec` = (band_min, band_max, r_min, r_max) is met
+    by a trial when r_min <= R <= r_max everywhere inside the band.
+
+    Returns a dict with the nominal spectrum, the P5/P50/P95 bands and the
+    yield against `spec` (None without a spec).
+    """
+    layers = expanded_layers(layers)
+    wavelengths = np.asarray(wavelengths, dtype=float)
+    n_values, d_values = stack_from_dataframe(layers, n_substrate, wavelengths=wavelengths, materials=materials)
+    rng = np.random.default_rng(seed)
+    trials_per_chunk = max(1, int(memory_budget // ((len(n_values) + 3) * wavelengths.size * np.dtype(complex).itemsize)))
+    spectra = np.empty((trials, wavelengths.size))
+    for start in range(0, trials, trials_per_chunk):
+        count = min(trials_per_chunk, trials - start)
+        n_scale = np.ones((len(n_values), count, 1))
+        d_scale = np.ones((len(d_values), count, 1))
+        n_scale[1:-1] += index_sigma * rng.standard_normal((len(layers), count, 1))
+        d_scale[1:-1] += thickness_sigma * rng.standard_normal((len(layers), count, 1))
+        n_trials = n_values.reshape(len(n_values), 1, -1) * n_scale
+        d_trials = d_values[:, np.newaxis, np.newaxis] * d_scale
+        spectra[start:start + count] = reflectance(n_trials, np.maximum(d_trials, 0), wavelengths, theta_incidence, polarization)
+
+    p5, p50, p95 = np.percentile(spectra, [5, 50, 95], axis=0)
+    spec_yield = None
+    if spec is not None:
+        band_min, band_max, r_min, r_max = spec
+        in_band = (wavelengths >= band_min) & (wavelengths <= band_max)
+        band = spectra[:, in_band]
+        spec_yield = float(np.mean(np.all((band >= r_min) & (band <= r_max), axis=1)))
+    return {
+        'nominal': reflectance(n_values, d_values, wavelengths, theta_incidence, polarization),
+        'P5': p5, 'P50': p50, 'P95': p95,
+        'yield': spec_yield,
+    }
+
+
+# Batch catalog: spectra and summary metrics for many designs
+LAYER_COLUMNS = ['Material', 'Refractive index n', 'Thickness (nm)']
+
+
+def designs_from_workbook(source, prefix=''):
+    """Every sheet of a workbook that has the layer columns, keyed by (prefix +) sheet name."""
+    sheets = pd.read_excel(source, sheet_name=None)
+    return {f'{prefix}{name}': sheet for name, sheet in sheets.items() if set(LAYER_COLUMNS) <= set(sheet.columns)}
+
+
+def designs_from_folder(folder):
+    """Designs from every workbook (all sheets) and CSV file in `folder`."""
+    designs = {}
+    for path in sorted(Path(folder).iterdir()):
+        if path.suffix.lower() in ('.xlsx', '.xls'):
+            designs.update(designs_from_workbook(path, prefix=f'{path.stem}/'))
+        elif path.suffix.lower() == '.csv':
+            table = pd.read_csv(path)
+            if set(LAYER_COLUMNS) <= set(table.columns):
+                designs[path.stem] = table
+    return designs
+
+
+def _catalog_spectrum(args):
+    # (spectrum, None), or (NaN spectrum, error message) so one bad design does not abort the catalog
+    layers, n_substrate, wavelengths, theta_incidence, polarization, materials = args
+    try:
+        return np.abs(table_reflection_coefficient(layers, n_substrate, 1.0, wavelengths, theta_incidence, polarization, materials)) ** 2, None
+    except Exception as error:
+        return np.full(wavelengths.size, np.nan), f'{type(error).__name__}: {error}'
+
+
+def _layer_count(layers):
+    try:
+        return len(expanded_layers(layers))
+    except Exception:
+        return np.nan
+
+
+def catalog_spectra(designs, n_substrate, wavelengths, theta_incidence=0.0, polarization="s", band=None, max_workers=None, materials=None):
+    """Spectra of many designs computed in parallel, plus one row of metrics per design.
+
+    `designs` maps a design name to its layers table. The summary has the
+    peak and minimum R (with their wavelengths) and the band-averaged R over
+    `band` = (band_min, band_max), or over the whole grid without a band.
+    Returns (summary, spectra) with spectra of shape (designs, samples).
+    A design that fails to compute gets a NaN spectrum and metrics, and the
+    reason in the summary's 'Error' column instead of raising.
+    """
+    wavelengths = np.asarray(wavelengths, dtype=float)
+    names = list(designs)
+    jobs = [(designs[name], n_substrate, wavelengths, theta_incidence, polarization, materials) for name in names]
+    workers = max_workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_catalog_spectrum, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    spectra = np.array([spectrum for spectrum, _ in results]).reshape(len(names), wavelengths.size)
+    failed = np.isnan(spectra).all(axis=1)
+    filled = np.where(failed[:, None], 0.0, spectra)
+
+    in_band = np.ones(wavelengths.size, dtype=bool) if band is None else (wavelengths >= band[0]) & (wavelengths <= band[1])
+    summary = pd.DataFrame({
+        'Design': names,
+        'Layers': [_layer_count(designs[name]) for name in names],
+        'Peak R': np.where(failed, np.nan, filled.max(axis=1)),
+        'Peak Wavelength (nm)': np.where(failed, np.nan, wavelengths[filled.argmax(axis=1)]),
+        'Min R': np.where(failed, np.nan, filled.min(axis=1)),
+        'Min Wavelength (nm)': np.where(failed, np.nan, wavelengths[filled.argmin(axis=1)]),
+        'Band-averaged R': [band_average(wavelengths[in_band], spectrum[in_band]) for spectrum in spectra],
+        'Error': [error for _, error in results],
+    })
+    return summary, spectra
+
+
+def write_catalog(destination, summary, wavelengths, spectra, file_format=None):
+    """Write the catalog as Parquet (summary + per-design spectrum lists) or NPZ.
+
+    `destination` is a path or a binary buffer; the format defaults to the
+    path's extension.
+    """
+    file_format = file_format or Path(destination).suffix.lstrip('.')
+    if file_format == 'parquet':
+        table = summary.copy()
+        table['Reflectance'] = list(spectra)
+        table['Wavelength (nm)'] = [np.asarray(wavelengths)] * len(table)
+        table.to_parquet(destination, index=False)
+    else:
+        summary = summary.fillna({'Error': ''}) if 'Error' in summary else summary
+        np.savez_compressed(destination, wavelengths=wavelengths, spectra=spectra, **{column: np.asarray(summary[column].tolist()) for column in summary})
+
+
+# Standing-wave field inside the stack
+def field_profile(n_values, d_values, wavelengths, theta_incidence=0.0, polarization="s", depths=None, samples=2000, margin=0.1):
+    """|E(z)|^2 relative to the incident intensity, for every depth and wavelength.
+
+    Uses the exact characteristic-matrix formulation: each region (ambient,
+    layers, substrate) gets its matrix entries, admittance and a reference
+    field from one backward sweep that starts from the transmitted field
+    [1, eta_substrate]. The field at every depth point is then
+    E(z) = cos(k t) E_ref - i sin(k t) / eta H_ref with t = z_ref - z,
+    evaluated for all points and wavelengths at once. Signs follow the n + ik
+    convention of the reflectance recursion, so fields decay in absorbing
+    layers. `depths` (nm, z = 0 at
+    the ambient interface) defaults to `samples` points spanning the stack
+    plus `margin` of it on each side. For p polarization the tangential
+    component is reported.
+
+    The profile is not derived from `layer_terms`: the spectrum's
+    layer-by-layer recursion only equals the exact result for a single layer
+    at normal incidence, so with more layers or at an angle the R it shows
+    differs from the one implied by this field. The exact R = |(eta_0 E_0 - H_0) / (eta_0 E_0 + H_0)|^2 is
+    returned alongside so the two can be compared.
+
+    Returns (depths, intensity of shape (depths, wavelengths), interfaces,
+    exact reflectance per wavelength).
+    """
+    wavelengths = np.atleast_1d(np.asarray(wavelengths, dtype=float))
+    num_regions = len(n_values)
+    n = np.broadcast_to(np.asarray(n_values, dtype=complex).reshape(num_regions, -1), (num_regions, wavelengths.size))
+    interfaces = np.concatenate(([0.0], np.cumsum(d_values[1:-1])))
+    total = interfaces[-1]
+    if depths is None:
+        pad = margin * max(total, wavelengths.max())
+        depths = np.linspace(-pad, total + pad, samples)
+    depths = np.asarray(depths, dtype=float)
+
+    n_sin = n[0] * np.sin(np.deg2rad(theta_incidence))  # Snell invariant
+    n_cos = np.sqrt(n ** 2 - n_sin ** 2)
+    admittance = n_cos if polarization == "s" else n ** 2 / n_cos
+    wavenumber = 2 * np.pi * n_cos / wavelengths
+
+    # Reference field of every region: bottom of each layer, top of the substrate and of the ambient
+    z_ref = np.concatenate(([0.0], interfaces[1:], [total]))
+    e_ref = np.empty((num_regions, wavelengths.size), dtype=complex)
+    h_ref = np.empty_like(e_ref)
+    e_ref[-1], h_ref[-1] = 1.0, admittance[-1]
+    e_ref[-2], h_ref[-2] = e_ref[-1], h_ref[-1]
+    for j in range(num_regions - 3, -1, -1):
+        delta = wavenumber[j + 1] * d_values[j + 1]
+        e_ref[j] = np.cos(delta) * e_ref[j + 1] - 1j * np.sin(delta) / admittance[j + 1] * h_ref[j + 1]
+        h_ref[j] = -1j * admittance[j + 1] * np.sin(delta) * e_ref[j + 1] + np.cos(delta) * h_ref[j + 1]
+
+    incident = (admittance[0] * e_ref[0] + h_ref[0]) / (2 * admittance[0])
+    reflected = (admittance[0] * e_ref[0] - h_ref[0]) / (2 * admittance[0])
+    region = np.searchsorted(interfaces, depths, side='right')
+    t = (z_ref[region] - depths)[:, np.newaxis]
+    phase = wavenumber[region] * t
+    field = np.cos(phase) * e_ref[region] - 1j * np.sin(phase) / admittance[region] * h_ref[region]
+    return depths, np.abs(field / incident) ** 2, interfaces, np.abs(reflected / incident) ** 2
@@ -1,46 +1,49 @@
+import os
+import tempfile
+
+import pandas as pd
 import streamlit as st
 
-# Constants
-SHIFT_LENGTH_HOURS = 12
-NUM_SHIFTS_PER_DAY = 2
-SECONDS_PER_HOUR = 3600
+from line_model import (DAY_SECONDS, LINE_SCHEMA, NUM_SHIFTS_PER_DAY, SECONDS_PER_HOUR, SHIFT_LENGTH_HOURS, VARIABILITY_SCHEMA, best_batch_size, buffer_capacities,
+                        default_line, max_plus_output, mixed_model_output, new_trace, optimize_line, read_table, replicate_line, simulate_line,
+                        trace_batches, trace_playback, validate_table)
 
 # User Inputs Section
 st.title("Rani Manufacturing Line Simulation")
 st.sidebar.header("User Inputs")
-num_stations = st.sidebar.number_input("Number of Stations", value=2, min_value=1)
-cycle_times = [
-    st.sidebar.number_input(f"Cycle Time for Station {i + 1} (seconds)", value=60, min_value=1) for i in range(num_stations)
-]
-budgets = [
-    st.sidebar.number_input(f"Budget for Station {i + 1} ($)", value=40000.00, min_value=0.00, format="%.2f")
-    for i in range(num_stations)
-]
-conveyance_budgets = [
-    st.sidebar.number_input(f"Conveyance Budget for Station {i + 1} to {i + 2} ($)", value=1000.00, min_value=0.00, format="%.2f")
-    for i in range(num_stations)
-]
-redundancies = [
-    st.sidebar.number_input(f"Redundancy Level for Station {i + 1}", value=1, min_value=1) for i in range(num_stations)
-]
-
-buffer_options = []
-buffer_units = []
-buffer_budgets = []
-for i in range(num_stations):
-    st.sidebar.subheader(f"Conveyance {i + 1} to {i + 2} Settings")
-    is_buffer = st.sidebar.checkbox(f"Set as Buffer for Conveyance {i + 1} to {i + 2}?", value=False)
-    buffer_options.append(is_buffer)
+uploaded_line = st.sidebar.file_uploader("Load Line Definition (CSV or YAML)", type=['csv', 'yaml', 'yml'])
+if uploaded_line is not None:
+    try:
+        line_table = read_table(uploaded_line, uploaded_line.name)
+    except Exception as e:
+        st.error(f"Could not read {uploaded_line.name}: {e}")
+        st.stop()
+else:
+    line_table = default_line(st.sidebar.number_input("Number of Stations", value=2, min_value=1))
 
-    if is_buffer:
-        units = st.sidebar.number_input(f"Buffer Units for Conveyance {i + 1} to {i + 2}", value=0, min_value=0)
-        budget = st.sidebar.number_input(f"Buffer Budget for Conveyance {i + 1} to {i + 2} ($)", value=40000.00, min_value=0.00, format="%.2f")
-        buffer_units.append(units)
-        buffer_budgets.append(budget)
-    else:
-        budget = st.sidebar.number_input(f"Conveyance Budget for Conveyance {i + 1} to {i + 2} ($)", value=40000.00, min_value=0.00, format="%.2f")
-        buffer_units.append(0)
-        buffer_budgets.append(budget)
+# The whole line is edited as one table: one row per station, with the settings of the conveyance after it
+st.subheader("Line Definition")
+edited_line = st.data_editor(line_table, num_rows="dynamic", use_container_width=True, column_config={
+    'Buffer': st.column_config.CheckboxColumn("Buffer", help="Set the conveyance after this station as a buffer"),
+    'Budget ($)': st.column_config.NumberColumn(format="$%.2f"),
+    'Conveyance Budget ($)': st.column_config.NumberColumn(format="$%.2f"),
+    'Buffer Budget ($)': st.column_config.NumberColumn(format="$%.2f"),
+})
+line, line_errors = validate_table(edited_line, LINE_SCHEMA)
+if line_errors:
+    for error in line_errors:
+        st.error(error)
+    st.stop()
+st.sidebar.download_button("Download Line Definition (CSV)", line.to_csv(index=False), "line_definition.csv", "text/csv")
+
+num_stations = len(line)
+cycle_times = line['Cycle Time (s)'].tolist()
+budgets = line['Budget ($)'].tolist()
+conveyance_budgets = line['Conveyance Budget ($)'].tolist()
+redundancies = line['Redundancy'].tolist()
+buffer_options = line['Buffer'].tolist()
+buffer_units = line['Buffer Units'].where(line['Buffer'], 0).tolist()
+buffer_budgets = line['Buffer Budget ($)'].tolist()
 
 
 
@@ -69,27 +72,46 @@ def calculate_total_output(total_cycle_time):
     return int((SHIFT_LENGTH_HOURS * SECONDS_PER_HOUR * NUM_SHIFTS_PER_DAY) / total_cycle_time)
 
 # Graph Creation Function
+def station_dot(i, cycle_time, budget, conveyance_budget, redundancy, is_buffer, units, buffer_budget):
+    # DOT statements for one station and the conveyance before it
+    badge = f'<TD BGCOLOR="#1f77b4"><FONT COLOR="white"> &#215;{redundancy} </FONT></TD>' if redundancy > 1 else ''
+    label = f'<<TABLE BORDER="0" CELLSPACING="2"><TR><TD>Station {i + 1}</TD>{badge}</TR><TR><TD COLSPAN="{2 if badge else 1}">{cycle_time:g}s<BR/>${budget:,.2f}</TD></TR></TABLE>>'
+    if is_buffer:
+        conveyance_label = f'"Buffer {i + 1} ({units} units)\\n${buffer_budget:,.2f}"'
+    else:
+        conveyance_label = f'"Conveyance {i + 1}\\n${conveyance_budget:,.2f}"'
+    return f'C{i + 1} [shape=rectangle, style="", label={conveyance_label}];\nS{i + 1} [label={label}];\nC{i + 1} -> S{i + 1} -> C{i + 2};'
+
+
+@st.cache_data(max_entries=32)
 def create_graph(cycle_times, budgets, conveyance_budgets, redundancies, buffer_options, buffer_units, buffer_budgets):
-    dot_string = 'digraph {rankdir=TB;'  # Vertical orientation
-    dot_string += '"Line Input" -> C1;'
-    for i in range(num_stations):
-        for r in range(redundancies[i]):
-            dot_string += f'C{i + 1} -> S{i + 1}_R{r + 1};'
-            label = f'"Station {i + 1} ({r + 1})\\n{cycle_times[i]}s\\n${budgets[i]:,.2f}"'  # Station label
-            dot_string += f'S{i + 1}_R{r + 1} [label={label}];'
-            dot_string += f'S{i + 1}_R{r + 1} -> C{i + 2};'
-        
-        # Conveyance or Buffer label
-        conveyance_label = f'"Conveyance {i + 1}\\n${conveyance_budgets[i]:,.2f}"'
-        if buffer_options[i]:
-            conveyance_label = f'"Buffer {i + 1} ({buffer_units[i]} units)\\n${buffer_budgets[i]:,.2f}"'  # Buffer label
-        dot_string += f'C{i + 1} [shape=rectangle, label={conveyance_label}];'
-    
-    dot_string += f'C{num_stations + 1} [shape=rectangle, label="Conveyance {num_stations + 1}"];'
-    dot_string += '"Line Output" [shape=ellipse];'
-    dot_string += f'C{num_stations + 1} -> "Line Output";'
-    dot_string += '}'
-    return dot_string
+    # One node per station, with its redundant machines shown as a multiplicity badge;
+    # cached so an unchanged line hands the same DOT to the chart and is not laid out again
+    num_stations = len(cycle_times)
+    lines = ['digraph {rankdir=TB;', 'node [shape=box, style=rounded];', '"Line Input" -> C1;']
+    lines.extend(station_dot(i, *row) for i, row in enumerate(zip(cycle_times, budgets, conveyance_budgets, redundancies, buffer_options, buffer_units, buffer_budgets)))
+    lines.append(f'C{num_stations + 1} [shape=rectangle, style="", label="Conveyance {num_stations + 1}"];')
+    lines.append('"Line Output" [shape=ellipse, style=""];')
+    lines.append(f'C{num_stations + 1} -> "Line Output";')
+    lines.append('}')
+    return '\n'.join(lines)
+
+
+# Whole-line results are cached by configuration, so reruns that do not change the line skip them
+cached_simulation = st.cache_data(max_entries=32)(simulate_line)
+cached_max_plus_output = st.cache_data(max_entries=32)(max_plus_output)
+cached_mixed_model_output = st.cache_data(max_entries=32)(mixed_model_output)
+cached_best_batch_size = st.cache_data(max_entries=8)(best_batch_size)
+
+
+@st.cache_data(max_entries=8)
+def simulation_playback(cycle_times, redundancies, capacities, frames=500):
+    # Records the simulated day and downsamples it to `frames` snapshots for the charts;
+    # long days or large lines spill the trace to a temporary Parquet file and stream it back in batches
+    with tempfile.TemporaryDirectory() as directory:
+        trace = new_trace(spill_path=os.path.join(directory, 'trace.parquet'))
+        simulate_line(cycle_times, redundancies, capacities, trace=trace)
+        return trace_playback(trace_batches(trace), len(cycle_times), frames=frames)
 
 
 
@@ -106,6 +128,135 @@ st.write(f"Total Cycle Time: {total_cycle_time:.2f} seconds")
 st.write(f"Total Budget: ${total_budget:,.2f}")
 st.write(f"Total Output: {total_output:,} pills per day")
 
+# Discrete-event simulation of the same line over one production day
+simulation = cached_simulation(cycle_times, redundancies, buffer_capacities(buffer_options, buffer_units))
+st.subheader("Discrete-Event Simulation")
+st.write(f"Simulated Output: {simulation['output']:,} pills per day ({simulation['output'] / (DAY_SECONDS / SECONDS_PER_HOUR):,.1f} per hour)")
+st.write(f"Events Processed: {simulation['events']:,}")
+st.write(f"Departure-Time Model Output: {cached_max_plus_output(cycle_times, redundancies, buffer_capacities(buffer_options, buffer_units)):,} pills per day")
+st.dataframe(pd.DataFrame({
+    'Station': [f"Station {i + 1}" for i in range(num_stations)],
+    'Utilization (%)': 100 * simulation['busy'],
+    'Down (%)': 100 * simulation['down'],
+    'Blocked (%)': 100 * simulation['blocked'],
+    'Starved (%)': 100 * simulation['starved'],
+}).round(2), hide_index=True)
+
+if st.checkbox("Show WIP and Station States Over Time"):
+    times, states = simulation_playback(cycle_times, redundancies, buffer_capacities(buffer_options, buffer_units))
+    hours = times / SECONDS_PER_HOUR
+    st.write("WIP per Conveyance (parts)")
+    st.line_chart(pd.DataFrame(states['buffer'], index=pd.Index(hours, name="Hour"), columns=[f"Conveyance {i + 1}" for i in range(num_stations)]))
+    frame = st.slider("Playback Time (hours)", 0.0, float(hours[-1]), 0.0, step=float(hours[1] - hours[0]))
+    k = int(round(frame / (hours[1] - hours[0])))
+    st.bar_chart(pd.DataFrame({
+        'Busy': states['busy'][k],
+        'Blocked': states['blocked'][k],
+        'Idle': [r - busy - blocked for r, busy, blocked in zip(redundancies, states['busy'][k], states['blocked'][k])],
+    }, index=[f"Station {i + 1}" for i in range(num_stations)]))
+
+# Monte Carlo replications with stochastic cycle times and failures
+st.subheader("Monte Carlo Replications")
+edited_variability = st.data_editor(pd.DataFrame({
+    'Station': [f"Station {i + 1}" for i in range(num_stations)],
+    'Cycle Time CV': [0.2] * num_stations,
+    'MTBF (hours)': [8.0] * num_stations,
+    'MTTR (minutes)': [15.0] * num_stations,
+}), disabled=['Station'], hide_index=True, column_config={
+    'Cycle Time CV': st.column_config.NumberColumn(min_value=0.0),
+    'MTBF (hours)': st.column_config.NumberColumn(min_value=0.01),
+    'MTTR (minutes)': st.column_config.NumberColumn(min_value=0.0),
+})
+variability, variability_errors = validate_table(edited_variability, VARIABILITY_SCHEMA)
+for error in variability_errors:
+    st.error(error)
+col1, col2, col3 = st.columns(3)
+max_replications = col1.number_input("Maximum Replications", value=200, min_value=10, step=10)
+target_half_width = col2.number_input("Target CI Half-Width (pills)", value=10.0, min_value=0.0)
+confidence = col3.selectbox("Confidence Level", [0.90, 0.95, 0.99], index=1)
+if st.button("Run Replications", disabled=bool(variability_errors)):
+    replications = replicate_line(
+        cycle_times, redundancies, buffer_capacities(buffer_options, buffer_units),
+        cv=variability['Cycle Time CV'].tolist(),
+        mtbf=(variability['MTBF (hours)'] * SECONDS_PER_HOUR).tolist(),
+        mttr=(variability['MTTR (minutes)'] * 60).tolist(),
+        replications=max_replications, target_half_width=target_half_width or None, confidence=confidence,
+    )
+    low, high = replications['ci']
+    st.write(f"Mean Output: {replications['mean']:,.1f} pills per day ({confidence:.0%} CI: {low:,.1f} to {high:,.1f})")
+    st.write(f"Replications Run: {len(replications['outputs'])}" + (" (target half-width reached)" if replications['converged'] else ""))
+    st.dataframe(pd.DataFrame({
+        'Station': variability['Station'],
+        'Utilization (%)': 100 * replications['busy'],
+        'Down (%)': 100 * replications['down'],
+        'Blocked (%)': 100 * replications['blocked'],
+        'Starved (%)': 100 * replications['starved'],
+    }).round(2), hide_index=True)
+
+
+# Budget-constrained search over redundancies and buffer units
+st.subheader("Design Optimizer")
+col1, col2, col3, col4 = st.columns(4)
+budget_limit = col1.number_input("Budget Limit ($)", value=round(1.5 * total_budget, 2), min_value=0.00, format="%.2f")
+buffer_unit_cost = col2.number_input("Cost per Buffer Unit ($)", value=500.00, min_value=0.00, format="%.2f")
+max_redundancy = col3.number_input("Max Redundancy per Station", value=10, min_value=1)
+max_buffer_units = col4.number_input("Max Units per Buffer", value=50, min_value=0)
+if st.button("Optimize Line", disabled=bool(variability_errors)):
+    designs = optimize_line(
+        cycle_times, budgets, conveyance_budgets, buffer_budgets, budget_limit, buffer_options, buffer_unit_cost,
+        cv=variability['Cycle Time CV'].tolist(),
+        mtbf=(variability['MTBF (hours)'] * SECONDS_PER_HOUR).tolist(),
+        mttr=(variability['MTTR (minutes)'] * 60).tolist(),
+        max_redundancy=max_redundancy, max_buffer_units=max_buffer_units,
+    )
+    if designs:
+        st.dataframe(pd.DataFrame({
+            'Redundancies': [", ".join(map(str, design['redundancies'])) for design in designs],
+            'Buffer Units': [", ".join(map(str, design['buffer_units'])) for design in designs],
+            'Total Budget ($)': [design['cost'] for design in designs],
+            'Estimated Output': [design['analytic_output'] for design in designs],
+            'Simulated Output': [design['output'] for design in designs],
+            'CI Half-Width': [design['half_width'] for design in designs],
+        }).round(1), hide_index=True)
+    else:
+        st.warning("The budget limit does not cover one machine per station.")
+
+
+# Mixed-model production with changeovers
+st.subheader("Mixed-Model Line")
+products = st.data_editor(pd.DataFrame({'Product': ["A", "B"], 'Mix (%)': [50.0, 50.0]}), num_rows="dynamic", hide_index=True)
+products = products.dropna().reset_index(drop=True)
+product_times = st.data_editor(pd.DataFrame(
+    {**{f"{product} Cycle Time (s)": cycle_times for product in products['Product']}, 'Changeover (s)': [300.0] * num_stations},
+    index=[f"Station {i + 1}" for i in range(num_stations)],
+))
+col1, col2 = st.columns(2)
+rule = col1.selectbox("Sequencing Rule", ["Batch", "Round-robin", "Custom"])
+if rule == "Batch":
+    batch_size = col2.number_input("Batch Size (units of the main product)", value=10, min_value=1)
+    sequence = None
+elif rule == "Custom":
+    batch_size = 1
+    sequence_text = col2.text_input("Product Sequence (repeated)", ", ".join(products['Product']))
+    names = list(products['Product'])
+    sequence = [names.index(name.strip()) for name in sequence_text.split(",") if name.strip() in names]
+else:
+    batch_size, sequence = 1, None
+
+if len(products) and (rule != "Custom" or sequence):
+    mixed_cycle_times = product_times[[f"{product} Cycle Time (s)" for product in products['Product']]].to_numpy().T
+    changeovers = product_times['Changeover (s)'].to_numpy()
+    capacities = buffer_capacities(buffer_options, buffer_units)
+    total, by_product = cached_mixed_model_output(mixed_cycle_times, changeovers, redundancies, capacities, products['Mix (%)'], rule.lower(), [batch_size], sequence)
+    st.write(f"Mixed-Model Output: {total[0]:,} units per day")
+    st.dataframe(pd.DataFrame({'Product': products['Product'], 'Units per Day': by_product[0]}), hide_index=True)
+    if rule == "Batch":
+        max_batch_size = st.number_input("Largest Batch Size to Try", value=100, min_value=2, max_value=500)
+    if rule == "Batch" and st.button("Find Best Batch Size"):
+        best, outputs = cached_best_batch_size(mixed_cycle_times, changeovers, redundancies, capacities, products['Mix (%)'], max_batch_size)
+        st.write(f"Best Batch Size: {best} ({outputs[best - 1]:,} units per day at the requested mix)")
+        st.line_chart(pd.DataFrame({'Units per Day at Mix': outputs}, index=pd.Index(range(1, max_batch_size + 1), name="Batch Size")))
+
 
 # Display Graphical Representation
 graph_dot_string = create_graph(cycle_times, budgets, conveyance_budgets, redundancies, buffer_options, buffer_units, buffer_budgets)
@@ -122,6 +273,11 @@ This application simulates a manufacturing line with multiple stations, conveyan
 It takes into account cycle times, budgets, redundancies, and buffer properties to calculate the total cycle time, total budget, 
 and total output per day. Below are the details of how these calculations are performed.
 """)
+st.write("""
+The line is defined in a single table with one row per station; the conveyance columns describe the conveyance after that station.
+Rows can be edited, added or deleted in place, and the whole table can be loaded from or saved to a CSV file (or loaded from YAML,
+as a list of rows with the same column names). Every row is checked before any calculation, and invalid values are reported by row.
+""")
 
 st.subheader("Cycle Time")
 st.write("""
@@ -157,10 +313,45 @@ st.latex(r"""
 \text{{Total Output}} = \frac{{\text{{SHIFT\_LENGTH\_HOURS}} \times \text{{SECONDS\_PER\_HOUR}} \times \text{{NUM\_SHIFTS\_PER\_DAY}}}}{{\text{{total cycle time}}}}
 """)
 
+st.subheader("Discrete-Event Simulation")
+st.write("""
+Alongside the formulas above, the line is simulated part by part over a full two-shift day. Each redundant machine is modeled individually,
+and each conveyance holds as many parts as its buffer units (a plain conveyance holds none).
+- A machine that finishes a part while the next conveyance is full stays blocked until downstream space frees up.
+- A machine with no part waiting upstream is starved. The first station always has material and the last station never blocks.
+- Utilization, down, blocked and starved times are reported as a percentage of each station's available machine time.
+- The state of every station and the parts waiting on every conveyance can be recorded over the day and played back hour by hour.
+
+The departure-time model computes the same line without simulating events: the time each part leaves each station is the latest of
+finishing its processing, the station's previous part leaving the machine it will use, and room opening up in the next conveyance.
+It keeps parts in order and gives redundant machines their parts in turn, which matches the simulation exactly when cycle times are fixed.
+
+The Monte Carlo replications repeat this simulation with random cycle times (gamma distributed with the given coefficient of variation)
+and random breakdowns (exponential time between failures while working and exponential repair times). Each replication uses its own
+reproducible random seed, and replications run in parallel until the confidence interval on daily output is narrower than the target.
+""")
+
+st.subheader("Design Optimizer")
+st.write("""
+The optimizer searches redundancy levels and buffer units under a budget limit, where the budget is the total budget above plus a cost
+per buffer unit. Only conveyances set as buffers can hold units. Starting from one machine per station, it repeatedly adds a machine or
+doubles a buffer, keeping the most promising designs according to a fast analytical throughput estimate that accounts for variability,
+breakdowns and buffer sizes. The best designs found are then checked with Monte Carlo replications of the simulation.
+""")
+
+st.subheader("Mixed-Model Line")
+st.write("""
+When the line runs several products, each product has its own cycle time at every station, and a machine that switches from one
+product to another first spends the station's changeover time. Products are released in batches (the product with the largest share
+runs the given batch size and the others run proportionally smaller batches), in an even round-robin mix, or in a custom repeating
+sequence. Output is computed with the departure-time model, so every batch size from 1 to 200 is evaluated at once when searching
+for the batch size with the highest daily output.
+""")
+
 st.subheader("Graphical Representation")
 st.write("""
 The graphical representation illustrates the manufacturing line, showing stations, conveyances, buffers, and redundancy levels. 
-- Stations with redundancy are represented by parallel branches.
+- Stations with redundancy are drawn as a single node with a badge showing the number of parallel machines.
 - Conveyances are represented as rectangles, and buffers are labeled with unit capacity.
 - Line Input and Line Output are shown at the beginning and end of the line, respectively.
 """)
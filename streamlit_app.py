@@ -1,79 +1,119 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
 import streamlit as st
 
-# Function to perform calculations
+from line_model import OPTION_SCHEMA, read_table, validate_table
+
+# Function to perform calculations; arguments may be scalars, NumPy arrays or DataFrame columns
 def calculate_values(cycle_time_per_machine, number_of_stations, total_budget):
     shift_length_hours = 12
     shifts_per_day = 2
     shift_length_seconds = shift_length_hours * 60 * 60
     pills_per_shift_per_machine = shift_length_seconds / cycle_time_per_machine
     pills_per_shift_entire_line = pills_per_shift_per_machine / number_of_stations
-    daily_output = round(pills_per_shift_entire_line * shifts_per_day)
-    budget_per_station = "${:,.2f}".format(total_budget / number_of_stations)
+    daily_output = np.round(pills_per_shift_entire_line * shifts_per_day).astype(int)
+    budget_per_station = total_budget / number_of_stations
     cycle_time_per_station = cycle_time_per_machine
     cycle_time_entire_process = cycle_time_per_station * number_of_stations
     return daily_output, budget_per_station, cycle_time_per_station, cycle_time_entire_process
 
-# Function to calculate additional budget based on production goals
+# Function to calculate additional budget based on production goals, elementwise like calculate_values;
+# NaN where a line produces nothing (its daily output rounds to 0)
 def calculate_additional_budget(daily_output, target_daily_output, total_budget):
-    number_of_additional_lines = (target_daily_output - daily_output) / daily_output
-    additional_budget_required = "${:,.2f}".format(number_of_additional_lines * total_budget)
-    return round(number_of_additional_lines), additional_budget_required
+    daily_output = np.asarray(daily_output)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        number_of_additional_lines = np.where(daily_output > 0, (target_daily_output - daily_output) / daily_output, np.nan)
+    additional_budget_required = number_of_additional_lines * np.asarray(total_budget)
+    return np.round(number_of_additional_lines), additional_budget_required
+
+# Sensitivity of daily output and cost per pill to cycle time and station count, in one broadcast evaluation
+@st.cache_data
+def sensitivity_grid(cycle_times, station_counts, budget_per_station, amortization_days):
+    cycle_time_grid, station_grid = np.meshgrid(cycle_times, station_counts, indexing='ij')
+    daily_output = calculate_values(cycle_time_grid, station_grid, budget_per_station * station_grid)[0]
+    with np.errstate(divide='ignore'):
+        cost_per_pill = budget_per_station * station_grid / (daily_output * amortization_days)
+    return daily_output, np.where(daily_output > 0, cost_per_pill, np.nan)
 
 # Layout
 st.title("Manufacturing Line Comparison Tool (for Ehsan :)")
-st.write("Compare two different manufacturing line options by modifying the values below.")
-
-# Input for Option 1
-st.sidebar.subheader("Option 1")
-cycle_time_per_machine_1 = st.sidebar.number_input("Cycle Time per Machine (seconds):", min_value=1, value=60, key='cycle1')
-number_of_stations_1 = st.sidebar.number_input("Number of Stations:", min_value=1, value=14, key='stations1')
-total_budget_1 = st.sidebar.number_input("Total Budget ($):", min_value=0, value=800000, key='budget1', format="%d")
-
-# Input for Option 2
-st.sidebar.subheader("Option 2")
-cycle_time_per_machine_2 = st.sidebar.number_input("Cycle Time per Machine (seconds):", min_value=1, value=60, key='cycle2')
-number_of_stations_2 = st.sidebar.number_input("Number of Stations:", min_value=1, value=14, key='stations2')
-total_budget_2 = st.sidebar.number_input("Total Budget ($):", min_value=0, value=800000, key='budget2', format="%d")
-
-# Calculations for Option 1
-daily_output_1, budget_per_station_1, cycle_time_per_station_1, cycle_time_entire_process_1 = calculate_values(cycle_time_per_machine_1, number_of_stations_1, total_budget_1)
-
-# Calculations for Option 2
-daily_output_2, budget_per_station_2, cycle_time_per_station_2, cycle_time_entire_process_2 = calculate_values(cycle_time_per_machine_2, number_of_stations_2, total_budget_2)
+st.write("Compare manufacturing line options by editing the table below: one row per option, add or delete rows as needed.")
+
+# Line options, edited as one table (or loaded from CSV / YAML) instead of per-option widgets
+uploaded_options = st.sidebar.file_uploader("Load Options (CSV or YAML)", type=['csv', 'yaml', 'yml'])
+if uploaded_options is not None:
+    try:
+        options_table = read_table(uploaded_options, uploaded_options.name)
+    except Exception as e:
+        st.error(f"Could not read {uploaded_options.name}: {e}")
+        st.stop()
+else:
+    options_table = pd.DataFrame({
+        'Option': ["Option 1", "Option 2"],
+        'Cycle Time per Machine (s)': [60, 60],
+        'Number of Stations': [14, 14],
+        'Total Budget ($)': [800000, 800000],
+    })
+edited_options = st.data_editor(options_table, num_rows="dynamic", use_container_width=True, column_config={
+    'Total Budget ($)': st.column_config.NumberColumn(format="$%d"),
+})
+options, option_errors = validate_table(edited_options, OPTION_SCHEMA)
+if option_errors:
+    for error in option_errors:
+        st.error(error)
+    st.stop()
+st.sidebar.download_button("Download Options (CSV)", options.to_csv(index=False), "line_options.csv", "text/csv")
+
+# Calculations for every option at once
+daily_outputs, budgets_per_station, cycle_times_per_station, cycle_times_entire_process = calculate_values(
+    options['Cycle Time per Machine (s)'], options['Number of Stations'], options['Total Budget ($)'])
 
 # Display results
-st.subheader("Option 1 vs Option 2")
-cols = st.columns(2)
+st.subheader(" vs ".join(options['Option']))
+cols = st.columns(len(options))
 
-with cols[0]:
-    st.markdown("**Option 1**")
-    st.write("Daily Output:", daily_output_1, "pills")
-    st.write("Budget per Station:", budget_per_station_1)
-    st.write("Cycle Time per Station:", cycle_time_per_station_1, "seconds")
-    st.write("Cycle Time for Entire Process:", cycle_time_entire_process_1, "seconds")
-
-with cols[1]:
-    st.markdown("**Option 2**")
-    st.write("Daily Output:", daily_output_2, "pills")
-    st.write("Budget per Station:", budget_per_station_2)
-    st.write("Cycle Time per Station:", cycle_time_per_station_2, "seconds")
-    st.write("Cycle Time for Entire Process:", cycle_time_entire_process_2, "seconds")
+for i, col in enumerate(cols):
+    with col:
+        st.markdown(f"**{options['Option'][i]}**")
+        st.write("Daily Output:", daily_outputs[i], "pills")
+        st.write("Budget per Station:", "${:,.2f}".format(budgets_per_station[i]))
+        st.write("Cycle Time per Station:", cycle_times_per_station[i], "seconds")
+        st.write("Cycle Time for Entire Process:", cycle_times_entire_process[i], "seconds")
 
 # New Section for Production Goals
 st.subheader("Production Goals and Budget Calculation")
 target_daily_output = st.number_input("Enter Target Daily Output (e.g., 10000 pills):", min_value=0, value=10000, format="%d")
-option_to_calculate = st.selectbox("Choose Option to Calculate Budget:", ["Option 1", "Option 2"])
 
-if option_to_calculate == "Option 1":
-    daily_output = daily_output_1
-    total_budget_option = total_budget_1
-else:
-    daily_output = daily_output_2
-    total_budget_option = total_budget_2
+numbers_of_additional_lines, additional_budgets_required = calculate_additional_budget(daily_outputs, target_daily_output, options['Total Budget ($)'])
+st.dataframe(pd.DataFrame({
+    'Option': options['Option'],
+    'Daily Output': daily_outputs,
+    'Number of Additional Lines Required': ["n/a" if np.isnan(n) else f"{n:.0f}" for n in numbers_of_additional_lines],
+    'Additional Budget Required': ["n/a" if np.isnan(b) else "${:,.2f}".format(b) for b in additional_budgets_required],
+}), hide_index=True)
+
+# Sensitivity Sweeps
+st.subheader("Sensitivity Analysis")
+col1, col2, col3 = st.columns(3)
+cycle_time_range = col1.slider("Cycle Time per Machine (seconds):", 1, 600, (10, 120))
+station_range = col2.slider("Number of Stations:", 1, 100, (1, 30))
+amortization_years = col3.number_input("Amortization Period (years):", min_value=1, value=5)
+budget_per_station_sweep = st.number_input("Budget per Station ($):", min_value=0.0, value=float(budgets_per_station[0]), format="%.2f")
+
+cycle_time_values = np.arange(cycle_time_range[0], cycle_time_range[1] + 1)
+station_values = np.arange(station_range[0], station_range[1] + 1)
+output_grid, cost_grid = sensitivity_grid(cycle_time_values, station_values, budget_per_station_sweep, amortization_years * 365)
 
-number_of_additional_lines, additional_budget_required = calculate_additional_budget(daily_output, target_daily_output, total_budget_option)
-st.write("Number of Additional Lines Required:", number_of_additional_lines)
-st.write("Additional Budget Required:", additional_budget_required)
+cols = st.columns(2)
+with cols[0]:
+    fig = px.imshow(output_grid, x=station_values, y=cycle_time_values, origin='lower', aspect='auto',
+                    labels=dict(x="Number of Stations", y="Cycle Time per Machine (s)", color="Pills per Day"), title="Daily Output")
+    st.plotly_chart(fig, use_container_width=True)
+with cols[1]:
+    fig = px.imshow(cost_grid, x=station_values, y=cycle_time_values, origin='lower', aspect='auto',
+                    labels=dict(x="Number of Stations", y="Cycle Time per Machine (s)", color="$ per Pill"), title="Cost per Pill")
+    st.plotly_chart(fig, use_container_width=True)
 
 
 # Legend and Explanation Section
@@ -100,6 +140,10 @@ st.markdown("**Additional Budget for Production Goals:**")
 st.latex(r"\text{{Number of Additional Lines}} = \frac{{\text{{Target Daily Output}} - \text{{Current Daily Output}}}}{{\text{{Current Daily Output}}}}")
 st.latex(r"\text{{Additional Budget Required}} = \text{{Number of Additional Lines}} \times \text{{Total Budget for One Line}}")
 
+# Sensitivity Analysis
+st.markdown("**Sensitivity Analysis:**")
+st.latex(r"\text{{Cost per Pill}} = \frac{{\text{{Budget per Station}} \times \text{{Number of Stations}}}}{{\text{{Daily Output}} \times 365 \times \text{{Amortization Period (years)}}}}")
+
 # Assumptions
 st.markdown("**Assumptions:**")
 st.markdown("""